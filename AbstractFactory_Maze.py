@@ -1,6 +1,8 @@
 from enum import Enum
 from abc import ABC, abstractmethod
 
+from Maze_Events import bus, EventType, PrintSink
+
 
 class Direction(Enum):
     North = 1
@@ -19,53 +21,85 @@ class Room(MapSite):
     def __init__(self, room_no):
         self.room_number = room_no
         self._sides = [None] * 4
+        if bus.enabled:
+            bus.emit(EventType.ROOM_CREATED, **self.describe())
 
     def get_side(self, direction: Direction):
-        return self._sides[direction.value - 1]
+        side = self._sides[direction.value - 1]
+        # A pooled wall that can be damaged is handed out as a view of this side, so reading it copies
+        # nothing and only damaging it gives the room its own wall
+        if isinstance(side, BombedWall) and side.shared:
+            return PooledWallView(self, direction.value - 1)
+        return side
 
     def set_side(self, direction: Direction, map_site: MapSite):
         self._sides[direction.value - 1] = map_site
 
+    def damage_wall(self, direction: Direction):
+        # Through get_side, so a pooled wall is copied by the view's damage() and room views of other
+        # maze layouts damage their own sides
+        wall = self.get_side(direction)
+        if isinstance(wall, BombedWall):
+            wall.damage()
+        return wall
+
+    def _own_side(self, index):
+        # Copy-on-write: a pooled wall is replaced by this room's own copy before it changes
+        side = self._sides[index] = self._sides[index].unshare()
+        return side
+
+    def describe(self):
+        return {"room": self.room_number, "kind": type(self).__name__}
+
     def enter(self):
-        print(f"Entering room number {self.room_number}")
+        if bus.enabled:
+            bus.emit(EventType.ROOM_ENTERED, **self.describe())
 
 
 class EnchantedRoom(Room):
     def __init__(self, room_no, spell):
-        super().__init__(room_no)
         self.spell = spell
-        print(f"EnchantedRoom {self.room_number} is created with spell '{self.spell}'")
+        super().__init__(room_no)
 
-    def enter(self):
-        print(f"Entering enchanted room number {self.room_number} with spell {self.spell}")
+    def describe(self):
+        return {**super().describe(), "spell": self.spell}
 
 
 class RoomWithABomb(Room):
     def __init__(self, room_no):
-        super().__init__(room_no)
         self.has_bomb = True
         self.bomb_exploded = False
+        super().__init__(room_no)
 
-    def enter(self):
-        if self.has_bomb and not self.bomb_exploded:
-            print(f"Entering room number {self.room_number} with a bomb!")
-        elif self.bomb_exploded:
-            print(f"Entering room number {self.room_number}.\n!!!The bomb has exploded!!!")
-        else:
-            print(f"entering room number {self.room_number}")
+    def describe(self):
+        return {**super().describe(), "has_bomb": self.has_bomb, "bomb_exploded": self.bomb_exploded}
 
     def explode_bomb(self):
         if self.has_bomb and not self.bomb_exploded:
             self.bomb_exploded = True
-            print(f"The bomb in room number {self.room_number} has exploded!")
+            if bus.enabled:
+                bus.emit(EventType.BOMB_EXPLODED, room=self.room_number)
 
 
 class Wall(MapSite):
+    shared = False
+
     def __init__(self):
-        print("Wall is created.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_CREATED, kind=type(self).__name__)
 
     def enter(self):
-        print("You hit a wall.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_HIT, kind=type(self).__name__, damaged=False)
+
+    def unshare(self):
+        # The copy stands in for a wall the room already had, so it is not reported as created
+        if not self.shared:
+            return self
+        wall = object.__new__(type(self))
+        wall.__dict__.update(self.__dict__)
+        wall.shared = False
+        return wall
 
 
 class BombedWall(Wall):
@@ -74,14 +108,69 @@ class BombedWall(Wall):
         self.is_damaged = False
 
     def enter(self):
-        if self.is_damaged:
-            print("You hit a damaged wall.")
-        else:
-            print("You hit a wall.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_HIT, kind=type(self).__name__, damaged=self.is_damaged)
 
     def damage(self):
         self.is_damaged = True
-        print("The wall is now damaged.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_DAMAGED, kind=type(self).__name__)
+
+
+class PooledWallView(BombedWall):
+    # What Room.get_side hands out for a pooled bombed wall: reads go to the wall the side holds now,
+    # writes go to the room's own copy of it
+    __slots__ = ("_room", "_index")
+
+    def __init__(self, room, index):
+        self._room = room
+        self._index = index
+
+    @property
+    def shared(self):
+        return self._room._sides[self._index].shared
+
+    @property
+    def is_damaged(self):
+        return self._room._sides[self._index].is_damaged
+
+    @is_damaged.setter
+    def is_damaged(self, value):
+        self.unshare().is_damaged = value
+
+    def unshare(self):
+        return self._room._own_side(self._index)
+
+    def enter(self):
+        self._room._sides[self._index].enter()
+
+    def damage(self):
+        self.unshare().damage()
+
+    def __eq__(self, other):
+        return isinstance(other, PooledWallView) and other._room is self._room and other._index == self._index
+
+    def __hash__(self):
+        return hash((id(self._room), self._index))
+
+
+class WallPool:
+    # Flyweight factory: every undamaged wall of a kind is the same instance
+    def __init__(self):
+        self._walls = {}
+
+    def get(self, wall_class):
+        wall = self._walls.get(wall_class)
+        if wall is None:
+            wall = self._walls[wall_class] = wall_class()
+            wall.shared = True
+        return wall
+
+    def __len__(self):
+        return len(self._walls)
+
+
+wall_pool = WallPool()
 
 
 class Door(MapSite):
@@ -89,15 +178,14 @@ class Door(MapSite):
         self.room_1 = room_1
         self.room_2 = room_2
         self.is_open = False
-        print(f"Door created between Room \
-{self.room_1.room_number if self.room_1 else 'None'} and \
-Room {self.room_2.room_number if self.room_2 else 'None'}")
+        if bus.enabled:
+            bus.emit(EventType.DOOR_CREATED, kind=type(self).__name__,
+                     room_1=self.room_1.room_number if self.room_1 else None,
+                     room_2=self.room_2.room_number if self.room_2 else None)
 
     def enter(self):
-        if self.is_open:
-            print("You pass through the door")
-        else:
-            print("The door is closed.")
+        if bus.enabled:
+            bus.emit(EventType.DOOR_ENTERED, kind=type(self).__name__, open=self.is_open)
 
     def other_side_from(self, room):
         if room == self.room_1:
@@ -109,17 +197,7 @@ Room {self.room_2.room_number if self.room_2 else 'None'}")
 
 
 class DoorNeedingSpell(Door):
-    def __init__(self, room_1=None, room_2=None):
-        super().__init__(room_1, room_2)
-        print(f"Door needing a spell created between Room \
-        {self.room_1.room_number if self.room_1 else 'None'} and \
-        Room {self.room_2.room_number if self.room_2 else 'None'}")
-
-    def enter(self):
-        if self.is_open:
-            print("You pass through the enchanted door.")
-        else:
-            print("The enchanted door is closed.")
+    pass
 
 
 class Maze:
@@ -134,11 +212,17 @@ class Maze:
 
 
 class MazeFactory:
+    wall_class = Wall
+
     def make_maze(self):
         return Maze()
 
     def make_wall(self):
-        return Wall()
+        return self.wall_class()
+
+    def shared_wall(self):
+        # The pooled wall of this factory's kind, for sides nothing will hold on to
+        return wall_pool.get(self.wall_class)
 
     def make_room(self, n):
         return Room(n)
@@ -159,12 +243,11 @@ class EnchantedMazeFactory(MazeFactory):
 
 
 class BombedMazeFactory(MazeFactory):
+    wall_class = BombedWall
+
     def make_room(self, n):
         return RoomWithABomb(n)
 
-    def make_wall(self):
-        return BombedWall()
-
 
 class MazeGame:
     def create_maze(self, factory: MazeFactory):
@@ -176,14 +259,14 @@ class MazeGame:
         a_maze.add_room(r1)
         a_maze.add_room(r2)
 
-        r1.set_side(Direction.North, factory.make_wall())
+        r1.set_side(Direction.North, factory.shared_wall())
         r1.set_side(Direction.East, a_door)
-        r1.set_side(Direction.South, factory.make_wall())
-        r1.set_side(Direction.West, factory.make_wall())
+        r1.set_side(Direction.South, factory.shared_wall())
+        r1.set_side(Direction.West, factory.shared_wall())
 
-        r2.set_side(Direction.North, factory.make_wall())
-        r2.set_side(Direction.East, factory.make_wall())
-        r2.set_side(Direction.South, factory.make_wall())
+        r2.set_side(Direction.North, factory.shared_wall())
+        r2.set_side(Direction.East, factory.shared_wall())
+        r2.set_side(Direction.South, factory.shared_wall())
         r2.set_side(Direction.West, a_door)
 
         return a_maze
@@ -191,6 +274,7 @@ class MazeGame:
 
 # Example usage
 if __name__ == "__main__":
+    bus.subscribe(PrintSink())
     maze_game = MazeGame()
 
     factory = MazeFactory()
@@ -1,5 +1,11 @@
+import sys
 from enum import Enum
 from abc import ABC, abstractmethod
+from functools import partial
+from itertools import repeat, starmap
+from time import perf_counter
+
+from Maze_Events import bus, EventType, PrintSink
 
 
 class Direction(Enum):
@@ -19,6 +25,8 @@ class Room(MapSite):
     def __init__(self, room_no):
         self.room_number = room_no
         self._sides = [None] * 4
+        if bus.enabled:
+            bus.emit(EventType.ROOM_CREATED, **self.describe())
 
     def get_side(self, direction: Direction):
         return self._sides[direction.value - 1]
@@ -26,46 +34,47 @@ class Room(MapSite):
     def set_side(self, direction: Direction, map_site: MapSite):
         self._sides[direction.value - 1] = map_site
 
+    def describe(self):
+        return {"room": self.room_number, "kind": type(self).__name__}
+
     def enter(self):
-        print(f"Entering room number {self.room_number}")
+        if bus.enabled:
+            bus.emit(EventType.ROOM_ENTERED, **self.describe())
 
 
 class EnchantedRoom(Room):
     def __init__(self, room_no, spell="ahura"):
-        super().__init__(room_no)
         self.spell = spell
-        print(f"EnchantedRoom {self.room_number} is created with spell '{self.spell}'")
+        super().__init__(room_no)
 
-    def enter(self):
-        print(f"Entering enchanted room number {self.room_number} with spell {self.spell}")
+    def describe(self):
+        return {**super().describe(), "spell": self.spell}
 
 
 class RoomWithABomb(Room):
     def __init__(self, room_no):
-        super().__init__(room_no)
         self.has_bomb = True
         self.bomb_exploded = False
+        super().__init__(room_no)
 
-    def enter(self):
-        if self.has_bomb and not self.bomb_exploded:
-            print(f"Entering room number {self.room_number} with a bomb!")
-        elif self.bomb_exploded:
-            print(f"Entering room number {self.room_number}.\n!!!The bomb has exploded!!!")
-        else:
-            print(f"entering room number {self.room_number}")
+    def describe(self):
+        return {**super().describe(), "has_bomb": self.has_bomb, "bomb_exploded": self.bomb_exploded}
 
     def explode_bomb(self):
         if self.has_bomb and not self.bomb_exploded:
             self.bomb_exploded = True
-            print(f"The bomb in room number {self.room_number} has exploded!")
+            if bus.enabled:
+                bus.emit(EventType.BOMB_EXPLODED, room=self.room_number)
 
 
 class Wall(MapSite):
     def __init__(self):
-        print("Wall is created.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_CREATED, kind=type(self).__name__)
 
     def enter(self):
-        print("You hit a wall.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_HIT, kind=type(self).__name__, damaged=False)
 
 
 class BombedWall(Wall):
@@ -74,14 +83,13 @@ class BombedWall(Wall):
         self.is_damaged = False
 
     def enter(self):
-        if self.is_damaged:
-            print("You hit a damaged wall.")
-        else:
-            print("You hit a wall.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_HIT, kind=type(self).__name__, damaged=self.is_damaged)
 
     def damage(self):
         self.is_damaged = True
-        print("The wall is now damaged.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_DAMAGED, kind=type(self).__name__)
 
 
 class Door(MapSite):
@@ -89,15 +97,14 @@ class Door(MapSite):
         self.room_1 = room_1
         self.room_2 = room_2
         self.is_open = False
-        print(f"Door created between Room \
-{self.room_1.room_number if self.room_1 else 'None'} and \
-Room {self.room_2.room_number if self.room_2 else 'None'}")
+        if bus.enabled:
+            bus.emit(EventType.DOOR_CREATED, kind=type(self).__name__,
+                     room_1=self.room_1.room_number if self.room_1 else None,
+                     room_2=self.room_2.room_number if self.room_2 else None)
 
     def enter(self):
-        if self.is_open:
-            print("You pass through the door")
-        else:
-            print("The door is closed.")
+        if bus.enabled:
+            bus.emit(EventType.DOOR_ENTERED, kind=type(self).__name__, open=self.is_open)
 
     def other_side_from(self, room):
         if room == self.room_1:
@@ -109,17 +116,7 @@ Room {self.room_2.room_number if self.room_2 else 'None'}")
 
 
 class DoorNeedingSpell(Door):
-    def __init__(self, room_1=None, room_2=None):
-        super().__init__(room_1, room_2)
-        print(f"Door needing a spell created between Room \
-        {self.room_1.room_number if self.room_1 else 'None'} and \
-        Room {self.room_2.room_number if self.room_2 else 'None'}")
-
-    def enter(self):
-        if self.is_open:
-            print("You pass through the enchanted door.")
-        else:
-            print("The enchanted door is closed.")
+    pass
 
 
 class Maze:
@@ -136,16 +133,38 @@ class Maze:
 class MazeFactory:
     def __init__(self):
         self.partCatalog = {}
+        # name -> the callable that builds the part, fixed when the part is added
+        self._constructors = {}
 
-    def add_part(self, part_class, name):
+    def add_part(self, part_class, name, **defaults):
+        # Keyword defaults (e.g. spell=...) are bound into the constructor once, not passed on every call
         self.partCatalog[name] = part_class
+        self._constructors[name] = partial(part_class, **defaults) if defaults else part_class
+
+    def constructor(self, part_name):
+        try:
+            return self._constructors[part_name]
+        except KeyError:
+            raise ValueError(f"Part {part_name} not found in catalog.") from None
 
     def make(self, part_name, *args, **kwargs):
-        part_class = self.partCatalog.get(part_name)
-        if part_class:
-            return part_class(*args, **kwargs)
-        else:
-            raise ValueError(f"Part {part_name} not found in catalog.")
+        try:
+            constructor = self._constructors[part_name]
+        except KeyError:
+            raise ValueError(f"Part {part_name} not found in catalog.") from None
+        return constructor(*args, **kwargs)
+
+    def make_many(self, part_name, count_or_args):
+        # An int makes that many parts with no arguments. Otherwise every item is the tuple of one part's
+        # positional arguments, e.g. (room_number,) or (room_1, room_2), all checked before any part is made.
+        constructor = self.constructor(part_name)
+        if isinstance(count_or_args, int):
+            return list(starmap(constructor, repeat((), count_or_args)))
+        items = list(count_or_args)
+        for item in items:
+            if not isinstance(item, tuple):
+                raise ValueError(f"make_many takes a count or argument tuples, not {item!r}.")
+        return list(starmap(constructor, items))
 
     def make_maze(self):
         return Maze()
@@ -218,8 +237,40 @@ class MazeGame:
         return factory
 
 
+def _build_per_call(factory, rooms):
+    made = [factory.make("room", n) for n in range(1, rooms + 1)]
+    walls = [factory.make("wall") for _ in range(2 * rooms)]
+    doors = [factory.make("door", r1, r2) for r1, r2 in zip(made, made[1:])]
+    return made, walls, doors
+
+
+def _build_many(factory, rooms):
+    made = factory.make_many("room", zip(range(1, rooms + 1)))
+    walls = factory.make_many("wall", 2 * rooms)
+    doors = factory.make_many("door", zip(made, made[1:]))
+    return made, walls, doors
+
+
+def benchmark(rooms=200_000):
+    # The part constructors dominate, so make_many() only saves the catalog lookup per part and runs
+    # within a few percent of make()
+    maze_game = MazeGame()
+    print(f"Making {rooms} rooms, {2 * rooms} walls and {rooms - 1} doors from the part catalog:")
+    for factory_type in (None, "enchanted", "bombed"):
+        factory = maze_game.create_maze_factory(factory_type)
+        timings = []
+        for build in (_build_per_call, _build_many):
+            began = perf_counter()
+            build(factory, rooms)
+            timings.append(perf_counter() - began)
+        parts = 4 * rooms - 1
+        print(f"  {factory_type or 'plain':<10} make() {parts / timings[0]:>12,.0f} parts/s   "
+              f"make_many() {parts / timings[1]:>12,.0f} parts/s   {timings[0] / timings[1]:5.2f}x")
+
+
 # Example usage
 if __name__ == "__main__":
+    console = bus.subscribe(PrintSink())
     maze_game = MazeGame()
 
     factory = maze_game.create_maze_factory()
@@ -275,3 +326,7 @@ if __name__ == "__main__":
     if isinstance(bombed_room1_wall, BombedWall):
         bombed_room1_wall.damage()
         bombed_room1_wall.enter()
+
+    bus.unsubscribe(console)
+    print()
+    benchmark(*map(int, sys.argv[1:2]))
@@ -1,6 +1,12 @@
+from array import array
 from enum import Enum
 from abc import ABC, abstractmethod
 
+from Maze_Connectivity import DisjointSet
+from Maze_DoorStates import DoorStates
+from Maze_Events import bus, EventType, PrintSink
+from Maze_Grid import GridTopology, OPPOSITE_SIDES
+
 
 class Direction(Enum):
     North = 1
@@ -9,6 +15,9 @@ class Direction(Enum):
     West = 4
 
 
+_DIRECTIONS = list(Direction)
+
+
 class MapSite(ABC):
     @abstractmethod
     def enter(self):
@@ -16,18 +25,52 @@ class MapSite(ABC):
 
 
 class Room(MapSite):
+    _maze = None
+
     def __init__(self, room_no):
         self.room_number = room_no
         self._sides = [None] * 4
+        if bus.enabled:
+            bus.emit(EventType.ROOM_CREATED, **self.describe())
 
     def get_side(self, direction: Direction):
-        return self._sides[direction.value - 1]
+        side = self._sides[direction.value - 1]
+        # A pooled wall that can be damaged is handed out as a view of this side, so reading it copies
+        # nothing and only damaging it gives the room its own wall
+        if isinstance(side, BombedWall) and side.shared:
+            return PooledWallView(self, direction.value - 1)
+        return side
 
     def set_side(self, direction: Direction, map_site: MapSite):
         self._sides[direction.value - 1] = map_site
+        if self._maze is not None:
+            self._maze.topology_changed()
+
+    def set_sides(self, map_site: MapSite):
+        # The same map site, e.g. one pooled wall, on all four sides
+        self._sides = [map_site] * 4
+        if self._maze is not None:
+            self._maze.topology_changed()
+
+    def damage_wall(self, direction: Direction):
+        # Through get_side, so a pooled wall is copied by the view's damage() and room views of other
+        # maze layouts damage their own sides
+        wall = self.get_side(direction)
+        if isinstance(wall, BombedWall):
+            wall.damage()
+        return wall
+
+    def _own_side(self, index):
+        # Copy-on-write: a pooled wall is replaced by this room's own copy before it changes
+        side = self._sides[index] = self._sides[index].unshare()
+        return side
+
+    def describe(self):
+        return {"room": self.room_number, "kind": type(self).__name__}
 
     def enter(self):
-        print(f"Entering room number {self.room_number}")
+        if bus.enabled:
+            bus.emit(EventType.ROOM_ENTERED, **self.describe())
 
     def __repr__(self):
         return  f"Room number {self.room_number}"
@@ -35,12 +78,11 @@ class Room(MapSite):
 
 class EnchantedRoom(Room):
     def __init__(self, room_no, spell):
-        super().__init__(room_no)
         self.spell = spell
-        print(f"EnchantedRoom {self.room_number} is created with spell '{self.spell}'")
+        super().__init__(room_no)
 
-    def enter(self):
-        print(f"Entering enchanted room number {self.room_number} with spell {self.spell}")
+    def describe(self):
+        return {**super().describe(), "spell": self.spell}
 
     def __repr__(self):
         return  f"EnchantedRoom number {self.room_number}"
@@ -48,30 +90,39 @@ class EnchantedRoom(Room):
 
 class RoomWithABomb(Room):
     def __init__(self, room_no):
-        super().__init__(room_no)
         self.has_bomb = True
         self.bomb_exploded = False
+        super().__init__(room_no)
 
-    def enter(self):
-        if self.has_bomb and not self.bomb_exploded:
-            print(f"Entering room number {self.room_number} with a bomb!")
-        elif self.bomb_exploded:
-            print(f"Entering room number {self.room_number}.\n!!!The bomb has exploded!!!")
-        else:
-            print(f"entering room number {self.room_number}")
+    def describe(self):
+        return {**super().describe(), "has_bomb": self.has_bomb, "bomb_exploded": self.bomb_exploded}
 
     def explode_bomb(self):
         if self.has_bomb and not self.bomb_exploded:
             self.bomb_exploded = True
-            print(f"The bomb in room number {self.room_number} has exploded!")
+            if bus.enabled:
+                bus.emit(EventType.BOMB_EXPLODED, room=self.room_number)
 
 
 class Wall(MapSite):
+    shared = False
+
     def __init__(self):
-        print("Wall is created.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_CREATED, kind=type(self).__name__)
 
     def enter(self):
-        print("You hit a wall.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_HIT, kind=type(self).__name__, damaged=False)
+
+    def unshare(self):
+        # The copy stands in for a wall the room already had, so it is not reported as created
+        if not self.shared:
+            return self
+        wall = object.__new__(type(self))
+        wall.__dict__.update(self.__dict__)
+        wall.shared = False
+        return wall
 
 
 class BombedWall(Wall):
@@ -80,30 +131,101 @@ class BombedWall(Wall):
         self.is_damaged = False
 
     def enter(self):
-        if self.is_damaged:
-            print("You hit a damaged wall.")
-        else:
-            print("You hit a wall.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_HIT, kind=type(self).__name__, damaged=self.is_damaged)
 
     def damage(self):
         self.is_damaged = True
-        print("The wall is now damaged.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_DAMAGED, kind=type(self).__name__)
+
+
+class PooledWallView(BombedWall):
+    # What Room.get_side hands out for a pooled bombed wall: reads go to the wall the side holds now,
+    # writes go to the room's own copy of it
+    __slots__ = ("_room", "_index")
+
+    def __init__(self, room, index):
+        self._room = room
+        self._index = index
+
+    @property
+    def shared(self):
+        return self._room._sides[self._index].shared
+
+    @property
+    def is_damaged(self):
+        return self._room._sides[self._index].is_damaged
+
+    @is_damaged.setter
+    def is_damaged(self, value):
+        self.unshare().is_damaged = value
+
+    def unshare(self):
+        return self._room._own_side(self._index)
+
+    def enter(self):
+        self._room._sides[self._index].enter()
+
+    def damage(self):
+        self.unshare().damage()
+
+    def __eq__(self, other):
+        return isinstance(other, PooledWallView) and other._room is self._room and other._index == self._index
+
+    def __hash__(self):
+        return hash((id(self._room), self._index))
+
+
+class WallPool:
+    # Flyweight factory: every undamaged wall of a kind is the same instance
+    def __init__(self):
+        self._walls = {}
+
+    def get(self, wall_class):
+        wall = self._walls.get(wall_class)
+        if wall is None:
+            wall = self._walls[wall_class] = wall_class()
+            wall.shared = True
+        return wall
+
+    def __len__(self):
+        return len(self._walls)
+
+
+wall_pool = WallPool()
 
 
 class Door(MapSite):
+    # Once registered with a maze's DoorStates, is_open is a view of the door's bit there
+    _states = None
+    door_id = -1
+
     def __init__(self, room_1=None, room_2=None):
         self.room_1 = room_1
         self.room_2 = room_2
-        self.is_open = False
-        print(f"Door created between Room \
-{self.room_1.room_number if self.room_1 else 'None'} and \
-Room {self.room_2.room_number if self.room_2 else 'None'}")
+        self._open = False
+        if bus.enabled:
+            bus.emit(EventType.DOOR_CREATED, kind=type(self).__name__,
+                     room_1=self.room_1.room_number if self.room_1 else None,
+                     room_2=self.room_2.room_number if self.room_2 else None)
+
+    @property
+    def is_open(self):
+        if self._states is not None:
+            return bool(self._states[self.door_id])
+        return self._open
+
+    @is_open.setter
+    def is_open(self, value):
+        if self._states is not None:
+            self._states[self.door_id] = value
+        else:
+            self._open = bool(value)
 
     def enter(self):
-        if self.is_open:
-            print("You pass through the door")
-        else:
-            print("The door is closed.")
+        if bus.enabled:
+            bus.emit(EventType.DOOR_ENTERED, kind=type(self).__name__, open=self.is_open)
 
     def other_side_from(self, room):
         if room == self.room_1:
@@ -115,37 +237,144 @@ Room {self.room_2.room_number if self.room_2 else 'None'}")
 
 
 class DoorNeedingSpell(Door):
-    def __init__(self, room_1=None, room_2=None):
+    def __init__(self, room_1=None, room_2=None, spell=None):
+        self.spell = spell
         super().__init__(room_1, room_2)
-        print(f"Door needing a spell created between Room \
-        {self.room_1.room_number if self.room_1 else 'None'} and \
-        Room {self.room_2.room_number if self.room_2 else 'None'}")
 
-    def enter(self):
-        if self.is_open:
-            print("You pass through the enchanted door.")
+
+class Adjacency:
+    # Compressed sparse row index: row r leads to rows neighbors[offsets[r]:offsets[r + 1]]
+    # through the doors door_ids[offsets[r]:offsets[r + 1]]
+    def __init__(self, room_numbers, offsets, neighbors, door_ids, door_open, doors=None):
+        self.room_numbers = room_numbers
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.door_ids = door_ids
+        self.door_open = door_open
+        self.doors = doors
+        first_id = room_numbers[0] if room_numbers else 0
+        if room_numbers == array('i', range(first_id, first_id + len(room_numbers))):
+            self.first_id, self._rows = first_id, None
         else:
-            print("The enchanted door is closed.")
+            self.first_id, self._rows = None, {number: row for row, number in enumerate(room_numbers)}
+
+    def __len__(self):
+        return len(self.room_numbers)
+
+    def row(self, room_number):
+        if self._rows is not None:
+            return self._rows.get(room_number, -1)
+        row = room_number - self.first_id
+        return row if 0 <= row < len(self.room_numbers) else -1
+
+
+class _DoorOpenView:
+    def __init__(self, doors):
+        self._doors = doors
+
+    def __getitem__(self, door_id):
+        return self._doors[door_id].is_open
+
+    def __len__(self):
+        return len(self._doors)
+
+
+def build_adjacency(rooms, door_states=None):
+    # Doors are recognised by interface so the Room classes of every maze module can be indexed.
+    # With door_states, door ids are the bitset's and it serves as door_open directly.
+    row_of = {number: row for row, number in enumerate(rooms)}
+    offsets = array('i', [0])
+    neighbors = array('i')
+    door_ids = array('i')
+    doors = []
+    door_id_of = {}
+    for room in rooms.values():
+        for side in room._sides:
+            if hasattr(side, "other_side_from"):
+                if door_states is not None:
+                    door_id = door_states.register(side)
+                else:
+                    door_id = door_id_of.get(id(side))
+                    if door_id is None:
+                        door_id = door_id_of[id(side)] = len(doors)
+                        doors.append(side)
+                other = side.other_side_from(room)
+                if other is not None and other.room_number in row_of:
+                    neighbors.append(row_of[other.room_number])
+                    door_ids.append(door_id)
+        offsets.append(len(neighbors))
+    if door_states is not None:
+        return Adjacency(array('i', rooms), offsets, neighbors, door_ids, door_states, door_states.doors)
+    return Adjacency(array('i', rooms), offsets, neighbors, door_ids, _DoorOpenView(doors), doors)
 
 
 class Maze:
     def __init__(self):
         self.rooms = {}
+        self.grid = None
+        self.landmarks = None
+        self._adjacency = None
+        # Union-find over room numbers, kept up to date by the builders as doors are placed
+        self.components = DisjointSet()
+        self.door_states = DoorStates()
 
     def add_room(self, room):
         self.rooms[room.room_number] = room
+        room._maze = self
+        self.components.add(room.room_number)
+        self.topology_changed()
 
     def room_no(self, room_number):
         return self.rooms.get(room_number, None)
 
+    def adjacency(self):
+        # Built on first use and cached until a room or a side changes
+        if self._adjacency is None:
+            self._adjacency = build_adjacency(self.rooms, self.door_states)
+        return self._adjacency
+
+    def topology_changed(self):
+        # Cached indexes describe the old layout, so they are dropped rather than patched
+        self._adjacency = None
+        self.landmarks = None
+
+    def connected(self, room_a, room_b):
+        return self.components.connected(room_a, room_b)
+
+    def component_count(self):
+        return self.components.components
+
+    def component_size(self, room_number):
+        return self.components.component_size(room_number)
+
     def __repr__(self):
         room_descriptions = [f"{key}: {value}" for key, value in self.rooms.items()]
         return "\n".join(room_descriptions)
 
 
+def door_pairs(pairs):
+    # Accepts (room_from, room_to) pairs, a flat array.array of endpoints or a NumPy N x 2 array
+    if isinstance(pairs, array):
+        return zip(pairs[0::2], pairs[1::2])
+    if hasattr(pairs, "tolist"):
+        return pairs.tolist()
+    return pairs
+
+
+def split_door_pairs(pairs):
+    if isinstance(pairs, array):
+        return pairs[0::2], pairs[1::2]
+    pairs = list(door_pairs(pairs))
+    if not pairs:
+        return (), ()
+    rooms_from, rooms_to = zip(*pairs)
+    return rooms_from, rooms_to
+
+
 class MazeBuilder(ABC):
-    def __init__(self):
+    def __init__(self, width=None, height=None):
         self._currentMaze = None  # Initialize _maze in the base class
+        self.grid = GridTopology(width, height) if width is not None and height is not None else None
 
     @abstractmethod
     def build_maze(self):
@@ -159,99 +388,165 @@ class MazeBuilder(ABC):
     def build_door(self, room_from, room_to):
         pass
 
+    def build_rooms(self, room_numbers):
+        for room_no in room_numbers:
+            self.build_room(room_no)
+
+    def build_doors(self, pairs):
+        for room_from, room_to in door_pairs(pairs):
+            self.build_door(room_from, room_to)
+
     def get_maze(self):
         return self._currentMaze
 
 
 class SimpleMazeBuilder(MazeBuilder):
-    def __init__(self):
-        super().__init__()
+    wall_class = Wall
+
+    def __init__(self, width=None, height=None):
+        super().__init__(width, height)
 
     def build_maze(self):
         self._currentMaze = Maze()
+        self._currentMaze.grid = self.grid
+
+    def make_room(self, room_no):
+        return Room(room_no)
+
+    def make_door(self, r1, r2):
+        return Door(r1, r2)
 
     def build_room(self, room_no):
         if self._currentMaze.room_no(room_no) is None:
-            room = Room(room_no)
+            room = self.make_room(room_no)
             self._currentMaze.add_room(room)
-            room.set_side(Direction.North, Wall())
-            room.set_side(Direction.South, Wall())
-            room.set_side(Direction.East, Wall())
-            room.set_side(Direction.West, Wall())
+            room.set_sides(wall_pool.get(self.wall_class))
+
+    def build_rooms(self, room_numbers):
+        maze = self._currentMaze
+        rooms = maze.rooms
+        make_room = self.make_room
+        wall = wall_pool.get(self.wall_class)
+        for room_no in room_numbers:
+            if room_no not in rooms:
+                room = make_room(room_no)
+                room.set_sides(wall)
+                maze.add_room(room)
 
     def build_door(self, room_from, room_to):
         r1 = self._currentMaze.room_no(room_from)
         r2 = self._currentMaze.room_no(room_to)
         if r1 is not None and r2 is not None:
-            door = Door(r1, r2)
+            door = self.make_door(r1, r2)
+            self._currentMaze.door_states.register(door)
             r1.set_side(self.common_wall(r1, r2), door)
             r2.set_side(self.common_wall(r2, r1), door)
+            self._currentMaze.components.union(room_from, room_to)
+
+    def build_doors(self, pairs):
+        rooms_from, rooms_to = split_door_pairs(pairs)
+        rooms = self._currentMaze.rooms
+        ends_from = list(map(rooms.get, rooms_from))
+        ends_to = list(map(rooms.get, rooms_to))
+        if None in ends_from or None in ends_to:
+            missing = next((a, b) for a, b, r1, r2 in zip(rooms_from, rooms_to, ends_from, ends_to)
+                           if r1 is None or r2 is None)
+            raise ValueError(f"Cannot place a door between rooms {missing[0]} and {missing[1]}.")
+        sides_from, sides_to = self.door_sides(rooms_from, rooms_to)
+        make_door = self.make_door
+        register = self._currentMaze.door_states.register
+        for r1, r2, side_from, side_to in zip(ends_from, ends_to, sides_from, sides_to):
+            door = make_door(r1, r2)
+            register(door)
+            r1._sides[side_from] = door
+            r2._sides[side_to] = door
+        union = self._currentMaze.components.union
+        for room_from, room_to in zip(rooms_from, rooms_to):
+            union(room_from, room_to)
+        self._currentMaze.topology_changed()
 
     def common_wall(self, room1, room2):
-        # Logic to determine the common wall direction
-        # Assuming a grid layout with rooms being adjacent either horizontally or vertically
-        if room1.room_number < room2.room_number:
-            return Direction.East if room2.room_number - room1.room_number == 1 else Direction.South
+        return self.direction_between(room1.room_number, room2.room_number)
+
+    def direction_between(self, room_from, room_to):
+        if self.grid is not None:
+            return _DIRECTIONS[self.grid.side_between(room_from, room_to)]
+        # Without grid dimensions, fall back to guessing from the room number difference
+        if room_from < room_to:
+            return Direction.East if room_to - room_from == 1 else Direction.South
         else:
-            return Direction.West if room1.room_number - room2.room_number == 1 else Direction.North
+            return Direction.West if room_from - room_to == 1 else Direction.North
+
+    def door_sides(self, rooms_from, rooms_to):
+        # Side indexes (Direction.value - 1) of both ends of every door in a batch
+        if self.grid is not None:
+            return self.grid.common_walls(rooms_from, rooms_to)
+        direction_between = self.direction_between
+        sides_from = bytes([direction_between(room_from, room_to).value - 1
+                            for room_from, room_to in zip(rooms_from, rooms_to)])
+        return sides_from, sides_from.translate(OPPOSITE_SIDES)
 
     def get_maze(self) -> Maze:
         return self._currentMaze
 
 
 class EnchantedMazeBuilder(SimpleMazeBuilder):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, width=None, height=None):
+        super().__init__(width, height)
 
-    def build_room(self, room_no):
-        if self._currentMaze.room_no(room_no) is None:
-            room = EnchantedRoom(room_no, self.cast_spell())
-            self._currentMaze.add_room(room)
-            room.set_side(Direction.North, Wall())
-            room.set_side(Direction.South, Wall())
-            room.set_side(Direction.East, Wall())
-            room.set_side(Direction.West, Wall())
+    def make_room(self, room_no):
+        return EnchantedRoom(room_no, self.cast_spell())
 
-    def build_door(self, room_from, room_to):
-        r1 = self._currentMaze.room_no(room_from)
-        r2 = self._currentMaze.room_no(room_to)
-        if r1 is not None and r2 is not None:
-            door = DoorNeedingSpell(r1, r2)
-            r1.set_side(self.common_wall(r1, r2), door)
-            r2.set_side(self.common_wall(r2, r1), door)
+    def make_door(self, r1, r2):
+        return DoorNeedingSpell(r1, r2, self.cast_spell())
 
     def cast_spell(self, spell="A mysterious spell"):
         return spell
 
 
 class BombedMazeBuilder(SimpleMazeBuilder):
-    def __init__(self):
-        super().__init__()
+    wall_class = BombedWall
 
-    def build_room(self, room_no):
-        if self._currentMaze.room_no(room_no) is None:
-            room = RoomWithABomb(room_no)
-            self._currentMaze.add_room(room)
-            room.set_side(Direction.North, BombedWall())
-            room.set_side(Direction.South, BombedWall())
-            room.set_side(Direction.East, BombedWall())
-            room.set_side(Direction.West, BombedWall())
+    def __init__(self, width=None, height=None):
+        super().__init__(width, height)
+
+    def make_room(self, room_no):
+        return RoomWithABomb(room_no)
 
 
 class CountingMazeBuilder(MazeBuilder):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, width=None, height=None):
+        super().__init__(width, height)
         self._rooms = 0
         self._doors = 0
 
     def build_maze(self):
         self._currentMaze = Maze()
+        self._currentMaze.grid = self.grid
 
+    # Dry run: no Room objects are made, but room numbers still go through the maze's union-find
     def build_room(self, room_no):
         self._rooms += 1
+        self._currentMaze.components.add(room_no)
+
+    def build_rooms(self, room_numbers):
+        if not hasattr(room_numbers, "__len__"):
+            room_numbers = list(room_numbers)
+        self._rooms += len(room_numbers)
+        self._currentMaze.components.add_range(room_numbers)
 
     def build_door(self, room_from, room_to):
         self._doors += 1
+        components = self._currentMaze.components
+        if room_from in components and room_to in components:
+            components.union(room_from, room_to)
+
+    def build_doors(self, pairs):
+        components = self._currentMaze.components
+        for room_from, room_to in door_pairs(pairs):
+            self._doors += 1
+            if room_from in components and room_to in components:
+                components.union(room_from, room_to)
 
     def get_counts(self):
         return self._rooms, self._doors
@@ -267,15 +562,19 @@ class MazeGame:
 
     def create_complex_maze(self, builder: MazeBuilder, n=1001):
         builder.build_maze()
-        for i in range(1, n+1):
-            builder.build_room(i)
+        builder.build_rooms(range(1, n + 1))
         builder.build_door(1, 2)
         # Add more complex connections and rooms
         return builder.get_maze()
 
+    def create_generated_maze(self, builder: MazeBuilder, generator):
+        # generator is a Maze_Generators.MazeGenerator; it sets the builder's grid and streams the passages
+        return generator.generate(builder)
+
 
 # Example usage
 if __name__ == "__main__":
+    bus.subscribe(PrintSink())
     maze_game = MazeGame()
 
     print("\nCreating a simple maze:")
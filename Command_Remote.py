@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 
+from Maze_Events import bus, EventType, PrintSink
+
 
 # Receiver
 class Lamp:
@@ -9,11 +11,13 @@ class Lamp:
 
     def turn_on(self):
         self.is_on = True
-        print('Lamp is ON.')
+        if bus.enabled:
+            bus.emit(EventType.LAMP_SWITCHED, on=True, intensity=self.intensity)
 
     def turn_off(self):
         self.is_on = False
-        print('Lamp is OFF.')
+        if bus.enabled:
+            bus.emit(EventType.LAMP_SWITCHED, on=False, intensity=self.intensity)
 
     def dim_down(self):
         if self.intensity <= 10:
@@ -143,30 +147,32 @@ class LampCommandFactory:
         }
 
 
-lamp_1 = Lamp()
-lamp_2 = Lamp()
-
-lamp_1_commands_factory = LampCommandFactory(lamp_1)
-lamp_1_commands = lamp_1_commands_factory.create_all_commands()
-on1, off1, down1, up1 = lamp_1_commands['on'], lamp_1_commands['off'],lamp_1_commands['down'], lamp_1_commands['up']
+# Example usage
+if __name__ == "__main__":
+    bus.subscribe(PrintSink())
 
+    lamp_1 = Lamp()
+    lamp_2 = Lamp()
 
-history_1 = CommandHistory()
-remote_1 = RemoteControl(history_1)
-remote_1.execute_command(on1)
-remote_1.execute_command(up1)
-print(lamp_1)
-remote_1.execute_command(up1)
-print(lamp_1)
-remote_1.execute_command(off1)
-remote_1.execute_command(off1)
-remote_1.undo_last()
-remote_1.undo_last()
-remote_1.undo_last()
-remote_1.undo_last()
+    lamp_1_commands_factory = LampCommandFactory(lamp_1)
+    lamp_1_commands = lamp_1_commands_factory.create_all_commands()
+    on1, off1, down1, up1 = lamp_1_commands['on'], lamp_1_commands['off'],lamp_1_commands['down'], lamp_1_commands['up']
 
-print(lamp_1)
 
-print(history_1)
+    history_1 = CommandHistory()
+    remote_1 = RemoteControl(history_1)
+    remote_1.execute_command(on1)
+    remote_1.execute_command(up1)
+    print(lamp_1)
+    remote_1.execute_command(up1)
+    print(lamp_1)
+    remote_1.execute_command(off1)
+    remote_1.execute_command(off1)
+    remote_1.undo_last()
+    remote_1.undo_last()
+    remote_1.undo_last()
+    remote_1.undo_last()
 
+    print(lamp_1)
 
+    print(history_1)
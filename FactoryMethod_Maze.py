@@ -1,6 +1,8 @@
 from enum import Enum
 from abc import ABC, abstractmethod
 
+from Maze_Events import bus, EventType, PrintSink
+
 
 class Direction(Enum):
     North = 1
@@ -30,6 +32,8 @@ class Room(MapSite):
     def __init__(self, room_no):
         self.room_number = room_no
         self._sides = [None] * 4
+        if bus.enabled:
+            bus.emit(EventType.ROOM_CREATED, **self.describe())
 
     def get_side(self, direction: Direction):
         return self._sides[direction.value - 1]
@@ -37,26 +41,31 @@ class Room(MapSite):
     def set_side(self, direction: Direction, map_site: MapSite):
         self._sides[direction.value - 1] = map_site
 
+    def describe(self):
+        return {"room": self.room_number, "kind": type(self).__name__}
+
     def enter(self):
-        print(f"Entering room number {self.room_number}")
+        if bus.enabled:
+            bus.emit(EventType.ROOM_ENTERED, **self.describe())
 
 
 class EnchantedRoom(Room):
     def __init__(self, room_no, spell):
-        super().__init__(room_no)
         self.spell = spell
-        print(f"EnchantedRoom {self.room_number} is created with spell '{self.spell}'")
+        super().__init__(room_no)
 
-    def enter(self):
-        print(f"Entering enchanted room number {self.room_number} with spell {self.spell}")
+    def describe(self):
+        return {**super().describe(), "spell": self.spell}
 
 
 class Wall(MapSite):
     def __init__(self):
-        print("Wall is created.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_CREATED, kind=type(self).__name__)
 
     def enter(self):
-        print("You hit a wall.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_HIT, kind=type(self).__name__, damaged=False)
 
 
 class Door(MapSite):
@@ -64,15 +73,14 @@ class Door(MapSite):
         self.room_1 = room_1
         self.room_2 = room_2
         self.is_open = False
-        print(f"Door created between Room \
-{self.room_1.room_number if self.room_1 else 'None'} and \
-Room {self.room_2.room_number if self.room_2 else 'None'}")
+        if bus.enabled:
+            bus.emit(EventType.DOOR_CREATED, kind=type(self).__name__,
+                     room_1=self.room_1.room_number if self.room_1 else None,
+                     room_2=self.room_2.room_number if self.room_2 else None)
 
     def enter(self):
-        if self.is_open:
-            print("You pass through the door")
-        else:
-            print("The door is closed.")
+        if bus.enabled:
+            bus.emit(EventType.DOOR_ENTERED, kind=type(self).__name__, open=self.is_open)
 
     def other_side_from(self, room):
         if room == self.room_1:
@@ -84,17 +92,7 @@ Room {self.room_2.room_number if self.room_2 else 'None'}")
 
 
 class DoorNeedingSpell(Door):
-    def __init__(self, room_1=None, room_2=None):
-        super().__init__(room_1, room_2)
-        print(f"Door needing a spell created between Room \
-        {self.room_1.room_number if self.room_1 else 'None'} and \
-        Room {self.room_2.room_number if self.room_2 else 'None'}")
-
-    def enter(self):
-        if self.is_open:
-            print("You pass through the enchanted door.")
-        else:
-            print("The enchanted door is closed.")
+    pass
 
 
 class MazeGame:
@@ -155,17 +153,7 @@ class EnchantedRoom(Room):
 
 
 class DoorNeedingSpell(Door):
-    def __init__(self, room_1=None, room_2=None):
-        super().__init__(room_1, room_2)
-        print(f"Door needing a spell created between Room \
-        {self.room_1.room_number if self.room_1 else 'None'} and \
-        Room {self.room_2.room_number if self.room_2 else 'None'}")
-
-    def enter(self):
-        if self.is_open:
-            print("You pass through the enchanted door.")
-        else:
-            print("The enchanted door is closed.")
+    pass
 
 
 class EnchantedMazeGame(MazeGame):
@@ -180,6 +168,7 @@ class EnchantedMazeGame(MazeGame):
 
 
 if __name__ == "__main__":
+    bus.subscribe(PrintSink())
     maze_game = MazeGame()
 
     maze = maze_game.create_maze()
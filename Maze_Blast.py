@@ -0,0 +1,157 @@
+import sys
+from array import array
+from collections import namedtuple
+from time import perf_counter
+
+from Builder_Maze import Direction, BombedWall, RoomWithABomb, BombedMazeBuilder
+from Maze_Compact import (CompactMaze, CompactMazeBuilder, ROOM_BOMBED, SIDE_BOMBED_WALL, STATE_BOMB_EXPLODED,
+                          damage_bit)
+from Maze_Generators import BacktrackerGenerator
+from Maze_Paths import adjacency_of
+
+# exploded: room numbers whose bombs went off, in blast order; wall_damage: one byte per adjacency
+# row holding the walls newly damaged there, with the same bits as CompactMaze.room_state;
+# reached: how many rooms the waves passed through
+BlastReport = namedtuple("BlastReport", ["exploded", "wall_damage", "reached"])
+
+_DIRECTIONS = list(Direction)
+# bytes.translate tables
+_IS_BOMB = bytes(kind == ROOM_BOMBED for kind in range(256))
+_IS_EXPLODED = bytes(state & STATE_BOMB_EXPLODED for state in range(256))
+_LOW_BYTE_IS_BOMBED_WALL = bytes(value == (SIDE_BOMBED_WALL & 0xFF) for value in range(256))
+_HIGH_BYTE_IS_NEGATIVE = bytes(value == 0xFF for value in range(256))
+_FLAG_TO_MASK = bytes([0, 0xFF]) + bytes(254)
+
+
+def _bytes_and(a, b):
+    return (int.from_bytes(a, "little") & int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+
+def _armed_rows(maze):
+    # One byte per adjacency row, 1 where an unexploded bomb sits
+    if isinstance(maze, CompactMaze):
+        rows = len(maze.room_kinds)
+        is_bomb = bytes(maze.room_kinds).translate(_IS_BOMB)
+        exploded = bytes(maze.room_state).translate(_IS_EXPLODED)
+        armed = int.from_bytes(is_bomb, "little") & ~int.from_bytes(exploded, "little")
+        return bytearray(armed.to_bytes(rows, "little"))
+    rooms = maze.rooms
+    return bytearray(isinstance(room, RoomWithABomb) and room.has_bomb and not room.bomb_exploded
+                     for room in map(rooms.get, adjacency_of(maze).room_numbers))
+
+
+def _detonate_compact(maze, exploded_rows):
+    # Whole-array update: every side that holds SIDE_BOMBED_WALL (low byte 0xFD, high byte 0xFF, which
+    # no door id can have) becomes a damage bit of its row, and exploded rows take those bits at once
+    rows = len(maze.room_kinds)
+    sides = array('i', maze.sides)
+    if sys.byteorder != "little":
+        sides.byteswap()
+    raw = sides.tobytes()
+    is_wall = _bytes_and(raw[0::4].translate(_LOW_BYTE_IS_BOMBED_WALL), raw[3::4].translate(_HIGH_BYTE_IS_NEGATIVE))
+    masks = sum(int.from_bytes(is_wall[index::4], "little") * damage_bit(index) for index in range(4))
+    selected = bytearray(rows)
+    for row in exploded_rows:
+        selected[row] = 1
+    bomb_bits = int.from_bytes(bytes([STATE_BOMB_EXPLODED]) * rows, "little")
+    hits = int.from_bytes(bytes(selected).translate(_FLAG_TO_MASK), "little") & (masks | bomb_bits)
+    state = int.from_bytes(maze.room_state, "little")
+    maze.room_state[:] = (state | hits).to_bytes(rows, "little")
+    return (hits & ~state & ~bomb_bits).to_bytes(rows, "little")
+
+
+def _detonate_objects(maze, graph, exploded_rows):
+    wall_damage = bytearray(len(graph))
+    for row in exploded_rows:
+        room = maze.room_no(graph.room_numbers[row])
+        room.explode_bomb()
+        bits = 0
+        for index, (direction, side) in enumerate(zip(_DIRECTIONS, room._sides)):
+            if isinstance(side, BombedWall) and not side.is_damaged:
+                room.damage_wall(direction)
+                bits |= damage_bit(index)
+        wall_damage[row] = bits
+    return bytes(wall_damage)
+
+
+def damaged_walls(maze, report):
+    # (room number, Direction) for every wall the blast damaged
+    room_numbers = adjacency_of(maze).room_numbers
+    for row, bits in enumerate(report.wall_damage):
+        if bits:
+            for index, direction in enumerate(_DIRECTIONS):
+                if bits & damage_bit(index):
+                    yield room_numbers[row], direction
+
+
+def blast(maze, room_number, radius=1):
+    # Waves travel through doors, open or not. A bomb within `radius` doors of an explosion goes
+    # off in turn and starts a full-strength wave of its own, so chains can cross the whole maze.
+    graph = adjacency_of(maze)
+    source = graph.row(room_number)
+    if source < 0 or maze.room_no(room_number) is None:
+        raise ValueError(f"Room {room_number} is not in the maze.")
+    armed = _armed_rows(maze)
+    if not armed[source]:
+        return BlastReport(array('i'), bytes(len(graph)), 0)
+    offsets, neighbors = graph.offsets, graph.neighbors
+    # Strength left when the wave reached each row, -1 where it never did
+    strength = array('i', [-1]) * len(graph)
+    exploded_rows = array('i', [source])
+    armed[source] = 0
+    strength[source] = radius
+    frontier = array('i', [source])
+    while frontier:
+        next_frontier = array('i')
+        for row in frontier:
+            remaining = strength[row] - 1
+            if remaining < 0:
+                continue
+            for edge in range(offsets[row], offsets[row + 1]):
+                nxt = neighbors[edge]
+                if armed[nxt]:
+                    armed[nxt] = 0
+                    exploded_rows.append(nxt)
+                    reach = radius
+                else:
+                    reach = remaining
+                if reach > strength[nxt]:
+                    strength[nxt] = reach
+                    next_frontier.append(nxt)
+        frontier = next_frontier
+    if isinstance(maze, CompactMaze):
+        wall_damage = _detonate_compact(maze, exploded_rows)
+    else:
+        wall_damage = _detonate_objects(maze, graph, exploded_rows)
+    room_numbers = graph.room_numbers
+    exploded = array('i', [room_numbers[row] for row in exploded_rows])
+    return BlastReport(exploded, wall_damage, len(strength) - strength.count(-1))
+
+
+def benchmark(width=1000, height=1000, radius=2):
+    began = perf_counter()
+    maze = BacktrackerGenerator(width, height, seed=9).generate(CompactMazeBuilder(ROOM_BOMBED))
+    built = perf_counter() - began
+    began = perf_counter()
+    maze.adjacency()
+    indexed = perf_counter() - began
+    began = perf_counter()
+    report = blast(maze, 1, radius)
+    elapsed = perf_counter() - began
+    walls = sum(bin(bits).count("1") for bits in report.wall_damage)
+    print(f"Bombed {width}x{height} maze built in {built:.2f} s, adjacency index {indexed:.2f} s; blast with "
+          f"radius {radius} set off {len(report.exploded)} bombs and damaged {walls} walls in {elapsed:.3f} s")
+
+
+# Example usage
+if __name__ == "__main__":
+    builder = BombedMazeBuilder(5, 1)
+    builder.build_maze()
+    builder.build_rooms(range(1, 6))
+    builder.build_doors([(1, 2), (2, 3), (3, 4), (4, 5)])
+    maze = builder.get_maze()
+    report = blast(maze, 1, radius=1)
+    print(f"Exploded rooms: {list(report.exploded)}, damaged walls: {list(damaged_walls(maze, report))}, "
+          f"room 5 bomb exploded: {maze.room_no(5).bomb_exploded}")
+    print()
+    benchmark(*map(int, sys.argv[1:4]))
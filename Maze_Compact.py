@@ -0,0 +1,569 @@
+import sys
+import tracemalloc
+from array import array
+from itertools import accumulate
+from time import perf_counter
+
+from Maze_Connectivity import DisjointSet
+from Maze_DoorStates import DoorBytes
+from Maze_Events import bus, PrintSink
+from Builder_Maze import (Direction, Room, EnchantedRoom, RoomWithABomb, Wall, BombedWall, Door,
+                          DoorNeedingSpell, Maze, SimpleMazeBuilder, MazeGame, wall_pool, split_door_pairs,
+                          Adjacency)
+
+# Room kinds stored in CompactMaze.room_kinds (0 marks an unused room number)
+ROOM_NONE = 0
+ROOM_PLAIN = 1
+ROOM_ENCHANTED = 2
+ROOM_BOMBED = 3
+
+# Side values stored in CompactMaze.sides; non-negative values are door ids
+SIDE_NONE = -1
+SIDE_WALL = -2
+SIDE_BOMBED_WALL = -3
+
+DOOR_PLAIN = 1
+DOOR_SPELL = 2
+
+# Bits of CompactMaze.room_state: bit 0 is the bomb, bits 1-4 are damaged walls (N, S, E, W)
+STATE_BOMB_EXPLODED = 1
+
+
+def damage_bit(direction_index):
+    return 2 << direction_index
+
+
+class RoomView(Room):
+    __slots__ = ("_maze", "_row")
+
+    def __init__(self, maze, row):
+        self._maze = maze
+        self._row = row
+
+    @property
+    def room_number(self):
+        return self._maze.first_id + self._row
+
+    def get_side(self, direction: Direction):
+        return self._maze._side_view(self._row, direction.value - 1)
+
+    def set_side(self, direction: Direction, map_site):
+        self._maze._set_side(self._row, direction.value - 1, map_site)
+
+    def __eq__(self, other):
+        return isinstance(other, RoomView) and other._maze is self._maze and other._row == self._row
+
+    def __hash__(self):
+        return hash((id(self._maze), self._row))
+
+    def __repr__(self):
+        return f"Room number {self.room_number}"
+
+
+class EnchantedRoomView(RoomView, EnchantedRoom):
+    __slots__ = ()
+
+    @property
+    def spell(self):
+        spell_id = self._maze.room_spells[self._row]
+        return self._maze.spells[spell_id] if spell_id >= 0 else None
+
+    def __repr__(self):
+        return f"EnchantedRoom number {self.room_number}"
+
+
+class RoomWithABombView(RoomView, RoomWithABomb):
+    __slots__ = ()
+
+    has_bomb = True
+
+    @property
+    def bomb_exploded(self):
+        return bool(self._maze.room_state[self._row] & STATE_BOMB_EXPLODED)
+
+    @bomb_exploded.setter
+    def bomb_exploded(self, value):
+        if value:
+            self._maze.room_state[self._row] |= STATE_BOMB_EXPLODED
+        else:
+            self._maze.room_state[self._row] &= ~STATE_BOMB_EXPLODED
+
+
+class WallView(Wall):
+    __slots__ = ()
+
+    def __init__(self):
+        pass
+
+
+class BombedWallView(BombedWall):
+    __slots__ = ("_maze", "_row", "_index")
+
+    def __init__(self, maze, row, index):
+        self._maze = maze
+        self._row = row
+        self._index = index
+
+    @property
+    def is_damaged(self):
+        return bool(self._maze.room_state[self._row] & damage_bit(self._index))
+
+    @is_damaged.setter
+    def is_damaged(self, value):
+        if value:
+            self._maze.room_state[self._row] |= damage_bit(self._index)
+        else:
+            self._maze.room_state[self._row] &= ~damage_bit(self._index)
+
+
+class DoorView(Door):
+    __slots__ = ("_maze", "door_id")
+
+    def __init__(self, maze, door_id):
+        self._maze = maze
+        self.door_id = door_id
+
+    @property
+    def room_1(self):
+        return self._maze.room_no(self._maze.door_rooms[2 * self.door_id])
+
+    @property
+    def room_2(self):
+        return self._maze.room_no(self._maze.door_rooms[2 * self.door_id + 1])
+
+    @property
+    def is_open(self):
+        return bool(self._maze.door_open[self.door_id])
+
+    @is_open.setter
+    def is_open(self, value):
+        self._maze.door_open[self.door_id] = 1 if value else 0
+
+    def __eq__(self, other):
+        return isinstance(other, DoorView) and other._maze is self._maze and other.door_id == self.door_id
+
+    def __hash__(self):
+        return hash((id(self._maze), self.door_id))
+
+
+class DoorNeedingSpellView(DoorView, DoorNeedingSpell):
+    __slots__ = ()
+
+    @property
+    def spell(self):
+        spell_id = self._maze.door_spells[self.door_id]
+        return self._maze.spells[spell_id] if spell_id >= 0 else None
+
+
+_WALL = WallView()
+_ROOM_VIEWS = {ROOM_PLAIN: RoomView, ROOM_ENCHANTED: EnchantedRoomView, ROOM_BOMBED: RoomWithABombView}
+_DOOR_VIEWS = {DOOR_PLAIN: DoorView, DOOR_SPELL: DoorNeedingSpellView}
+
+
+class CompactMaze:
+    def __init__(self, first_id=1):
+        self.first_id = first_id
+        self.grid = None
+        self.room_count = 0
+        self.room_kinds = array('B')
+        self.room_spells = array('i')
+        self.room_state = bytearray()
+        self.sides = array('i')
+        self.door_rooms = array('i')
+        self.door_kinds = array('B')
+        self.door_spells = array('i')
+        self.door_open = DoorBytes()
+        self.spells = []
+        self._spell_ids = {}
+        self._adjacency = None
+        self.landmarks = None
+        self._components = DisjointSet()
+
+    @property
+    def components(self):
+        # Mazes loaded from storage start without one; it is rebuilt from the door table on first use
+        if self._components is None:
+            components = DisjointSet()
+            for room_number in self.room_numbers():
+                components.add(room_number)
+            for room_from, room_to in zip(self.door_rooms[0::2], self.door_rooms[1::2]):
+                components.union(room_from, room_to)
+            self._components = components
+        return self._components
+
+    def intern_spell(self, spell):
+        if spell is None:
+            return -1
+        spell_id = self._spell_ids.get(spell)
+        if spell_id is None:
+            spell_id = self._spell_ids[spell] = len(self.spells)
+            self.spells.append(spell)
+        return spell_id
+
+    def _row(self, room_number):
+        row = room_number - self.first_id
+        if 0 <= row < len(self.room_kinds) and self.room_kinds[row]:
+            return row
+        return -1
+
+    def _grow(self, rows):
+        self.topology_changed()
+        count = rows - len(self.room_kinds)
+        if count > 0:
+            self.room_kinds.frombytes(bytes(count))
+            self.room_spells.extend(array('i', [-1]) * count)
+            self.room_state.extend(bytes(count))
+            self.sides.extend(array('i', [SIDE_NONE]) * (4 * count))
+
+    def add_room(self, room_number, kind=ROOM_PLAIN, spell=None, side=SIDE_WALL):
+        row = room_number - self.first_id
+        if row < 0:
+            raise ValueError(f"Room number {room_number} is below the first id {self.first_id}.")
+        # Doors in door_rooms already lead to an existing room, so its sides cannot be reset
+        if self._row(room_number) >= 0:
+            raise ValueError(f"Room {room_number} is already in the maze.")
+        self._grow(row + 1)
+        self.room_count += 1
+        self.components.add(room_number)
+        self.room_kinds[row] = kind
+        self.room_spells[row] = self.intern_spell(spell)
+        self.room_state[row] = 0
+        self.sides[4 * row:4 * row + 4] = array('i', [side] * 4)
+        return row
+
+    def add_rooms(self, room_numbers, kind=ROOM_PLAIN, spell=None, side=SIDE_WALL):
+        if isinstance(room_numbers, range) and room_numbers.step == 1 \
+                and room_numbers.start - self.first_id >= len(self.room_kinds):
+            self._grow(room_numbers.start - self.first_id)
+            count = len(room_numbers)
+            self.room_kinds.frombytes(bytes([kind]) * count)
+            self.room_spells.extend(array('i', [self.intern_spell(spell)]) * count)
+            self.room_state.extend(bytes(count))
+            self.sides.extend(array('i', [side]) * (4 * count))
+            self.room_count += count
+            self.components.add_range(room_numbers)
+        else:
+            for room_number in room_numbers:
+                self.add_room(room_number, kind, spell, side)
+
+    def add_door(self, room_from, room_to, direction_from: Direction, direction_to: Direction, kind=DOOR_PLAIN,
+                 spell=None):
+        row_from = self._row(room_from)
+        row_to = self._row(room_to)
+        if row_from < 0 or row_to < 0:
+            raise ValueError(f"Cannot place a door between rooms {room_from} and {room_to}.")
+        self.topology_changed()
+        door_id = len(self.door_kinds)
+        self.door_rooms.append(room_from)
+        self.door_rooms.append(room_to)
+        self.door_kinds.append(kind)
+        self.door_spells.append(self.intern_spell(spell))
+        self.door_open.append(0)
+        self.sides[4 * row_from + direction_from.value - 1] = door_id
+        self.sides[4 * row_to + direction_to.value - 1] = door_id
+        self.components.union(room_from, room_to)
+        return door_id
+
+    def add_doors(self, rooms_from, rooms_to, sides_from, sides_to, kind=DOOR_PLAIN, spell=None):
+        # sides_from / sides_to hold side indexes (Direction.value - 1) rather than Direction members.
+        # Every endpoint is validated before the arrays are touched, so a bad batch changes nothing.
+        rows_from = [room_from - self.first_id for room_from in rooms_from]
+        rows_to = [room_to - self.first_id for room_to in rooms_to]
+        kinds = self.room_kinds
+        for rooms, rows in ((rooms_from, rows_from), (rooms_to, rows_to)):
+            if rows and (min(rows) < 0 or max(rows) >= len(kinds) or not all(map(kinds.__getitem__, rows))):
+                bad = next(room for room in rooms if self._row(room) < 0)
+                raise ValueError(f"Cannot place a door at missing room {bad}.")
+        self.topology_changed()
+        first_door = len(self.door_kinds)
+        count = len(rows_from)
+        endpoints = array('i', bytes(8 * count))
+        endpoints[0::2] = array('i', rooms_from)
+        endpoints[1::2] = array('i', rooms_to)
+        self.door_rooms.extend(endpoints)
+        self.door_kinds.frombytes(bytes([kind]) * count)
+        self.door_spells.extend(array('i', [self.intern_spell(spell)]) * count)
+        self.door_open.extend(bytes(count))
+        sides = self.sides
+        for door_id, row_from, row_to, side_from, side_to in zip(
+                range(first_door, first_door + count), rows_from, rows_to, sides_from, sides_to):
+            sides[4 * row_from + side_from] = door_id
+            sides[4 * row_to + side_to] = door_id
+        union = self.components.union
+        for room_from, room_to in zip(rooms_from, rooms_to):
+            union(room_from, room_to)
+        return range(first_door, first_door + count)
+
+    def adjacency(self):
+        # One CSR row per room number from first_id on; unused room numbers have no neighbours
+        if self._adjacency is None:
+            sides, door_rooms = self.sides, self.door_rooms
+            positions = [index for index, value in enumerate(sides) if value >= 0]
+            door_ids = array('i', [sides[position] for position in positions])
+            # The other end of a door is (row_a + row_b) - own row
+            row_sums = [a + b - 2 * self.first_id for a, b in zip(door_rooms[0::2], door_rooms[1::2])]
+            neighbors = array('i', [row_sums[door_id] - (position >> 2)
+                                    for position, door_id in zip(positions, door_ids)])
+            is_door = bytes([value >= 0 for value in sides])
+            offsets = array('i', [0])
+            offsets.extend(accumulate(sum(is_door[index:index + 4]) for index in range(0, len(is_door), 4)))
+            room_numbers = array('i', range(self.first_id, self.first_id + len(self.room_kinds)))
+            self._adjacency = Adjacency(room_numbers, offsets, neighbors, door_ids, self.door_open)
+        return self._adjacency
+
+    def topology_changed(self):
+        self._adjacency = None
+        self.landmarks = None
+
+    def connected(self, room_a, room_b):
+        return self.components.connected(room_a, room_b)
+
+    def component_count(self):
+        return self.components.components
+
+    def component_size(self, room_number):
+        return self.components.component_size(room_number)
+
+    @property
+    def door_count(self):
+        return len(self.door_kinds)
+
+    def room_numbers(self):
+        first_id = self.first_id
+        return (first_id + row for row, kind in enumerate(self.room_kinds) if kind)
+
+    def room_no(self, room_number):
+        row = self._row(room_number)
+        if row < 0:
+            return None
+        return _ROOM_VIEWS[self.room_kinds[row]](self, row)
+
+    def side(self, room_number, direction: Direction):
+        row = self._row(room_number)
+        return self.sides[4 * row + direction.value - 1] if row >= 0 else SIDE_NONE
+
+    def _side_view(self, row, index):
+        value = self.sides[4 * row + index]
+        if value >= 0:
+            return _DOOR_VIEWS[self.door_kinds[value]](self, value)
+        if value == SIDE_WALL:
+            return _WALL
+        if value == SIDE_BOMBED_WALL:
+            return BombedWallView(self, row, index)
+        return None
+
+    def _set_side(self, row, index, map_site):
+        self.topology_changed()
+        if map_site is None:
+            value = SIDE_NONE
+        elif isinstance(map_site, DoorView) and map_site._maze is self:
+            value = map_site.door_id
+        elif isinstance(map_site, Door):
+            room_from, room_to = map_site.room_1.room_number, map_site.room_2.room_number
+            value = len(self.door_kinds)
+            self.door_rooms.extend((room_from, room_to))
+            self.door_kinds.append(DOOR_SPELL if isinstance(map_site, DoorNeedingSpell) else DOOR_PLAIN)
+            self.door_spells.append(self.intern_spell(getattr(map_site, "spell", None)))
+            self.door_open.append(1 if map_site.is_open else 0)
+        elif isinstance(map_site, BombedWall):
+            value = SIDE_BOMBED_WALL
+            if map_site.is_damaged:
+                self.room_state[row] |= damage_bit(index)
+            else:
+                self.room_state[row] &= ~damage_bit(index)
+        elif isinstance(map_site, Wall):
+            value = SIDE_WALL
+        else:
+            raise ValueError(f"Cannot store {map_site!r} in a CompactMaze.")
+        self.sides[4 * row + index] = value
+
+    @classmethod
+    def from_maze(cls, maze: Maze):
+        numbers = sorted(maze.rooms)
+        compact = cls(first_id=numbers[0] if numbers else 1)
+        door_ids = {}
+        for number in numbers:
+            room = maze.rooms[number]
+            if isinstance(room, RoomWithABomb):
+                row = compact.add_room(number, ROOM_BOMBED, side=SIDE_NONE)
+                if room.bomb_exploded:
+                    compact.room_state[row] |= STATE_BOMB_EXPLODED
+            elif isinstance(room, EnchantedRoom):
+                row = compact.add_room(number, ROOM_ENCHANTED, room.spell, side=SIDE_NONE)
+            else:
+                row = compact.add_room(number, ROOM_PLAIN, side=SIDE_NONE)
+            for index, side in enumerate(room._sides):
+                if isinstance(side, Door):
+                    door_id = door_ids.get(id(side))
+                    if door_id is None:
+                        door_id = door_ids[id(side)] = len(compact.door_kinds)
+                        compact.door_rooms.extend((side.room_1.room_number, side.room_2.room_number))
+                        compact.door_kinds.append(DOOR_SPELL if isinstance(side, DoorNeedingSpell) else DOOR_PLAIN)
+                        compact.door_spells.append(compact.intern_spell(getattr(side, "spell", None)))
+                        compact.door_open.append(1 if side.is_open else 0)
+                    compact.sides[4 * row + index] = door_id
+                elif side is not None:
+                    compact._set_side(row, index, side)
+        union = compact.components.union
+        for room_from, room_to in zip(compact.door_rooms[0::2], compact.door_rooms[1::2]):
+            union(room_from, room_to)
+        return compact
+
+    def to_maze(self):
+        maze = Maze()
+        for row, kind in enumerate(self.room_kinds):
+            number = self.first_id + row
+            if kind == ROOM_ENCHANTED:
+                room = EnchantedRoom(number, self.spells[self.room_spells[row]])
+            elif kind == ROOM_BOMBED:
+                room = RoomWithABomb(number)
+                room.bomb_exploded = bool(self.room_state[row] & STATE_BOMB_EXPLODED)
+            elif kind == ROOM_PLAIN:
+                room = Room(number)
+            else:
+                continue
+            maze.add_room(room)
+        doors = []
+        for door_id, kind in enumerate(self.door_kinds):
+            ends = maze.room_no(self.door_rooms[2 * door_id]), maze.room_no(self.door_rooms[2 * door_id + 1])
+            if kind == DOOR_SPELL:
+                spell_id = self.door_spells[door_id]
+                door = DoorNeedingSpell(*ends, self.spells[spell_id] if spell_id >= 0 else None)
+            else:
+                door = Door(*ends)
+            door.is_open = bool(self.door_open[door_id])
+            doors.append(door)
+            maze.components.union(door.room_1.room_number, door.room_2.room_number)
+        for number, room in maze.rooms.items():
+            row = number - self.first_id
+            for index, direction in enumerate(Direction):
+                value = self.sides[4 * row + index]
+                if value >= 0:
+                    room.set_side(direction, doors[value])
+                elif value == SIDE_WALL:
+                    room.set_side(direction, wall_pool.get(Wall))
+                elif value == SIDE_BOMBED_WALL:
+                    room.set_side(direction, wall_pool.get(BombedWall))
+                    if self.room_state[row] & damage_bit(index):
+                        room.damage_wall(direction)
+        return maze
+
+    def __repr__(self):
+        return "\n".join(f"{number}: {self.room_no(number)}" for number in self.room_numbers())
+
+
+class CompactMazeBuilder(SimpleMazeBuilder):
+    def __init__(self, room_kind=ROOM_PLAIN, width=None, height=None):
+        super().__init__(width, height)
+        self.room_kind = room_kind
+        self.wall_kind = SIDE_BOMBED_WALL if room_kind == ROOM_BOMBED else SIDE_WALL
+        self.door_kind = DOOR_SPELL if room_kind == ROOM_ENCHANTED else DOOR_PLAIN
+
+    def build_maze(self):
+        self._currentMaze = CompactMaze()
+        self._currentMaze.grid = self.grid
+
+    def build_room(self, room_no):
+        if self._currentMaze._row(room_no) < 0:
+            spell = self.cast_spell() if self.room_kind == ROOM_ENCHANTED else None
+            self._currentMaze.add_room(room_no, self.room_kind, spell, self.wall_kind)
+
+    def build_rooms(self, room_numbers):
+        maze = self._currentMaze
+        spell = self.cast_spell() if self.room_kind == ROOM_ENCHANTED else None
+        if isinstance(room_numbers, range) and room_numbers.step == 1 \
+                and room_numbers.start - maze.first_id >= len(maze.room_kinds):
+            maze.add_rooms(room_numbers, self.room_kind, spell, self.wall_kind)
+        else:
+            for room_no in room_numbers:
+                if maze._row(room_no) < 0:
+                    maze.add_room(room_no, self.room_kind, spell, self.wall_kind)
+
+    def build_door(self, room_from, room_to):
+        # Rooms may be given by number or as the rooms themselves, as MazeGame.create_maze does;
+        # a missing room raises like build_doors does
+        room_from = getattr(room_from, "room_number", room_from)
+        room_to = getattr(room_to, "room_number", room_to)
+        maze = self._currentMaze
+        if maze._row(room_from) < 0 or maze._row(room_to) < 0:
+            raise ValueError(f"Cannot place a door between rooms {room_from} and {room_to}.")
+        maze.add_door(room_from, room_to, self.direction_between(room_from, room_to),
+                      self.direction_between(room_to, room_from), self.door_kind, self.door_spell())
+
+    def build_doors(self, pairs):
+        rooms_from, rooms_to = split_door_pairs(pairs)
+        sides_from, sides_to = self.door_sides(rooms_from, rooms_to)
+        self._currentMaze.add_doors(rooms_from, rooms_to, sides_from, sides_to, self.door_kind, self.door_spell())
+
+    def cast_spell(self, spell="A mysterious spell"):
+        return spell
+
+    def door_spell(self):
+        return self.cast_spell() if self.door_kind == DOOR_SPELL else None
+
+    def get_maze(self) -> CompactMaze:
+        return self._currentMaze
+
+
+def _build_per_call(builder, rooms, pairs):
+    builder.build_maze()
+    for room_no in rooms:
+        builder.build_room(room_no)
+    for room_from, room_to in pairs:
+        builder.build_door(room_from, room_to)
+    return builder.get_maze()
+
+
+def _build_batch(builder, rooms, pairs):
+    builder.build_maze()
+    builder.build_rooms(rooms)
+    builder.build_doors(pairs)
+    return builder.get_maze()
+
+
+def benchmark(width=1000, height=1000):
+    rooms = range(1, width * height + 1)
+    pairs = [(room, room + 1) for room in rooms if room % width] + \
+            [(room, room + width) for room in range(1, width * (height - 1) + 1)]
+    print(f"Building a {width}x{height} grid ({len(rooms)} rooms, {len(pairs)} doors):")
+    for label, make_builder in (("Maze (dict of Room objects)", lambda: SimpleMazeBuilder(width, height)),
+                                ("CompactMaze (typed arrays)", lambda: CompactMazeBuilder(width=width, height=height))):
+        for mode, build in (("per-call", _build_per_call), ("batch", _build_batch)):
+            start = perf_counter()
+            maze = build(make_builder(), rooms, pairs)
+            elapsed = perf_counter() - start
+            del maze
+            tracemalloc.start()
+            maze = build(make_builder(), rooms, pairs)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del maze
+            print(f"  {label:<30} {mode:<9} build {elapsed:7.2f} s   memory {current / 2 ** 20:8.1f} MiB")
+
+
+# Example usage
+if __name__ == "__main__":
+    console = bus.subscribe(PrintSink())
+    maze_game = MazeGame()
+
+    print("\nCreating a compact bombed maze:")
+    compact_maze = maze_game.create_complex_maze(CompactMazeBuilder(ROOM_BOMBED), 5)
+    room1 = compact_maze.room_no(1)
+
+    room1.enter()
+    door = room1.get_side(Direction.East)
+    if isinstance(door, Door):
+        door.enter()
+        next_room = door.other_side_from(room1)
+        next_room.enter()
+
+    room1.explode_bomb()
+    room1.enter()
+    room1_wall = room1.get_side(Direction.North)
+    if isinstance(room1_wall, BombedWall):
+        room1_wall.damage()
+        room1_wall.enter()
+
+    bus.unsubscribe(console)
+    print()
+    benchmark(*map(int, sys.argv[1:3]))
@@ -0,0 +1,107 @@
+from array import array
+
+
+class DisjointSet:
+    # Union-find over room numbers with path compression and union by rank.
+    # Contiguous room numbers are mapped arithmetically; any other numbering falls back to a dict.
+    def __init__(self):
+        self._first = 0
+        self._index = None
+        self._parent = array('i')
+        self._rank = bytearray()
+        self._size = array('i')
+        self.components = 0
+
+    def __len__(self):
+        return len(self._parent)
+
+    def __contains__(self, room_number):
+        return isinstance(room_number, int) and self._element(room_number) >= 0
+
+    def _element(self, room_number):
+        if self._index is not None:
+            return self._index.get(room_number, -1)
+        element = room_number - self._first
+        return element if 0 <= element < len(self._parent) else -1
+
+    def add(self, room_number):
+        if self._element(room_number) >= 0:
+            return
+        element = len(self._parent)
+        if self._index is None:
+            if not element:
+                self._first = room_number
+            elif room_number != self._first + element:
+                self._index = {self._first + existing: existing for existing in range(element)}
+        if self._index is not None:
+            self._index[room_number] = element
+        self._parent.append(element)
+        self._rank.append(0)
+        self._size.append(1)
+        self.components += 1
+
+    def add_range(self, room_numbers):
+        start = len(self._parent)
+        if self._index is None and isinstance(room_numbers, range) and room_numbers.step == 1 and \
+                (not start or room_numbers.start == self._first + start):
+            if not start:
+                self._first = room_numbers.start
+            count = len(room_numbers)
+            self._parent.extend(range(start, start + count))
+            self._rank.extend(bytes(count))
+            self._size.extend(array('i', [1]) * count)
+            self.components += count
+        else:
+            for room_number in room_numbers:
+                self.add(room_number)
+
+    def _find(self, element):
+        parent = self._parent
+        root = element
+        while parent[root] != root:
+            root = parent[root]
+        while parent[element] != root:
+            parent[element], element = root, parent[element]
+        return root
+
+    def _root(self, room_number):
+        element = self._element(room_number)
+        if element < 0:
+            raise ValueError(f"Room {room_number} is not tracked.")
+        return self._find(element)
+
+    def union(self, room_a, room_b):
+        root_a, root_b = self._root(room_a), self._root(room_b)
+        if root_a == root_b:
+            return False
+        rank = self._rank
+        if rank[root_a] < rank[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._size[root_a] += self._size[root_b]
+        if rank[root_a] == rank[root_b]:
+            rank[root_a] += 1
+        self.components -= 1
+        return True
+
+    def connected(self, room_a, room_b):
+        return self._root(room_a) == self._root(room_b)
+
+    def component_size(self, room_number):
+        return self._size[self._root(room_number)]
+
+
+# Example usage
+if __name__ == "__main__":
+    from Builder_Maze import CountingMazeBuilder, SimpleMazeBuilder
+
+    width, height = 8, 8
+    pairs = [(room, room + 1) for room in range(1, width * height + 1) if room % width and room % 3]
+    for builder in (SimpleMazeBuilder(width, height), CountingMazeBuilder(width, height)):
+        builder.build_maze()
+        builder.build_rooms(range(1, width * height + 1))
+        builder.build_doors(pairs)
+        maze = builder.get_maze()
+        print(f"{type(builder).__name__}: {maze.component_count()} components, "
+              f"1-2 connected: {maze.connected(1, 2)}, 1-3 connected: {maze.connected(1, 3)}, "
+              f"size of room 1's component: {maze.component_size(1)}")
@@ -0,0 +1,233 @@
+import sys
+from time import perf_counter
+
+
+class DoorStates:
+    # Open/closed state of every door packed one bit per door id. Registered Door objects read and
+    # write their is_open through it, and the adjacency index hands it out as door_open.
+    def __init__(self, count=0):
+        self._bits = bytearray((count + 7) >> 3)
+        self._count = count
+        self.doors = []
+        # Bumped by every write, so caches built from the door states can tell they are stale
+        self.version = 0
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, door_id):
+        if not 0 <= door_id < self._count:
+            raise IndexError(f"Door id {door_id} is outside 0..{self._count - 1}.")
+        return self._bits[door_id >> 3] >> (door_id & 7) & 1
+
+    def __setitem__(self, door_id, is_open):
+        if not 0 <= door_id < self._count:
+            raise IndexError(f"Door id {door_id} is outside 0..{self._count - 1}.")
+        self.version += 1
+        if is_open:
+            self._bits[door_id >> 3] |= 1 << (door_id & 7)
+        else:
+            self._bits[door_id >> 3] &= ~(1 << (door_id & 7))
+
+    def grow(self, count):
+        if count > self._count:
+            self._count = count
+            self._bits.extend(bytes(((count + 7) >> 3) - len(self._bits)))
+
+    def register(self, door):
+        # Gives a Door object an id and moves its current state into the bitset. A door already in
+        # another maze's bitset is refused, as taking it over would silently move it out of that maze.
+        states = getattr(door, "_states", None)
+        if states is self:
+            return door.door_id
+        if states is not None:
+            raise ValueError(f"Door {door.door_id} already belongs to another maze's door states.")
+        is_open = door.is_open
+        door_id = self._count
+        self.grow(door_id + 1)
+        self.doors.append(door)
+        door._states, door.door_id = self, door_id
+        self[door_id] = is_open
+        return door_id
+
+    def set_many(self, door_ids, is_open):
+        door_ids = _checked(door_ids, self._count)
+        if isinstance(door_ids, range) and door_ids.step == 1 and len(door_ids):
+            start, stop = door_ids.start, door_ids.stop
+            # Whole bytes in the middle are written as one slice, the partial bytes at either end bit by bit
+            first_byte, last_byte = -(-start // 8), stop // 8
+            if first_byte < last_byte:
+                self.version += 1
+                self._bits[first_byte:last_byte] = (b"\xff" if is_open else b"\x00") * (last_byte - first_byte)
+                door_ids = list(range(start, first_byte * 8)) + list(range(last_byte * 8, stop))
+        for door_id in door_ids:
+            self[door_id] = is_open
+
+    def count_open(self):
+        return int.from_bytes(self._bits, "little").bit_count()
+
+    def tobytes(self):
+        return bytes(self._bits)
+
+    def open_ids(self):
+        return [door_id for door_id in range(self._count) if self[door_id]]
+
+
+class DoorBytes(bytearray):
+    # CompactMaze's one byte per door, counting its writes in version as DoorStates does
+    __slots__ = ("version",)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.version = 0
+
+    def __setitem__(self, index, value):
+        self.version += 1
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index):
+        self.version += 1
+        super().__delitem__(index)
+
+    def __iadd__(self, values):
+        self.version += 1
+        return super().__iadd__(values)
+
+    def append(self, value):
+        self.version += 1
+        super().append(value)
+
+    def extend(self, values):
+        self.version += 1
+        super().extend(values)
+
+
+def _checked(door_ids, count):
+    # Every id is checked before any door changes, so a bad batch leaves the doors as they were
+    if isinstance(door_ids, range):
+        ends = (door_ids[0], door_ids[-1]) if door_ids else ()
+    else:
+        door_ids = ends = list(door_ids)
+    if ends and (min(ends) < 0 or max(ends) >= count):
+        bad = next(door_id for door_id in door_ids if not 0 <= door_id < count)
+        raise IndexError(f"Door id {bad} is outside 0..{count - 1}.")
+    return door_ids
+
+
+def door_state(door_open):
+    # Snapshot of an adjacency index's door_open, whether a DoorStates bitset, a byte per door or a
+    # per-door view, to compare with a later one
+    if isinstance(door_open, (bytes, bytearray)):
+        return bytes(door_open)
+    if hasattr(door_open, "tobytes"):
+        return door_open.tobytes()
+    return bytes(bool(door_open[door_id]) for door_id in range(len(door_open)))
+
+
+def set_doors(maze, door_ids, is_open):
+    # Works on Builder_Maze mazes (bitset) and on CompactMaze (one byte per door)
+    states = getattr(maze, "door_states", None)
+    if states is not None:
+        states.set_many(door_ids, is_open)
+        return
+    door_open = maze.door_open
+    door_ids = _checked(door_ids, len(door_open))
+    value = 1 if is_open else 0
+    if isinstance(door_ids, range) and door_ids.step == 1:
+        door_open[door_ids.start:door_ids.stop] = bytes([value]) * len(door_ids)
+    else:
+        for door_id in door_ids:
+            door_open[door_id] = value
+
+
+def open_doors(maze, door_ids):
+    set_doors(maze, door_ids, True)
+
+
+def close_doors(maze, door_ids):
+    set_doors(maze, door_ids, False)
+
+
+def room_doors(maze, room_numbers):
+    # Ids of every door on a side of any of the rooms
+    graph = maze.adjacency()
+    offsets, door_ids = graph.offsets, graph.door_ids
+    found = set()
+    for room_number in room_numbers:
+        row = graph.row(room_number)
+        if row >= 0:
+            found.update(door_ids[offsets[row]:offsets[row + 1]])
+    return sorted(found)
+
+
+def rectangle_doors(maze, x0, y0, x1, y1):
+    # Ids of the doors with both rooms inside the grid rectangle (x0, y0)-(x1, y1), corners included
+    grid = maze.grid
+    if grid is None:
+        raise ValueError("Selecting doors by rectangle needs a maze with grid dimensions.")
+    x0, x1 = max(min(x0, x1), 0), min(max(x0, x1), grid.width - 1)
+    y0, y1 = max(min(y0, y1), 0), min(max(y0, y1), grid.height - 1)
+    graph = maze.adjacency()
+    offsets, neighbors, door_ids, room_numbers = graph.offsets, graph.neighbors, graph.door_ids, graph.room_numbers
+    first_id, width = grid.first_id, grid.width
+    found = set()
+    for y in range(y0, y1 + 1):
+        for room_number in range(first_id + y * width + x0, first_id + y * width + x1 + 1):
+            row = graph.row(room_number)
+            if row < 0:
+                continue
+            for edge in range(offsets[row], offsets[row + 1]):
+                ny, nx = divmod(room_numbers[neighbors[edge]] - first_id, width)
+                if x0 <= nx <= x1 and y0 <= ny <= y1:
+                    found.add(door_ids[edge])
+    return sorted(found)
+
+
+def set_room_doors(maze, room_numbers, is_open):
+    set_doors(maze, room_doors(maze, room_numbers), is_open)
+
+
+def set_rectangle_doors(maze, x0, y0, x1, y1, is_open):
+    set_doors(maze, rectangle_doors(maze, x0, y0, x1, y1), is_open)
+
+
+def count_open(maze):
+    states = getattr(maze, "door_states", None)
+    if states is not None:
+        return states.count_open()
+    return len(maze.door_open) - maze.door_open.count(0)
+
+
+def benchmark(doors=10_000_000):
+    states = DoorStates(doors)
+    began = perf_counter()
+    states.set_many(range(3, doors - 3), True)
+    opened = perf_counter() - began
+    began = perf_counter()
+    count = states.count_open()
+    counted = perf_counter() - began
+    print(f"{doors} doors in {len(states._bits) / 2 ** 20:.1f} MB: opened a range in {opened * 1000:.2f} ms, "
+          f"counted {count} open in {counted * 1000:.2f} ms")
+
+
+# Example usage
+if __name__ == "__main__":
+    from Builder_Maze import SimpleMazeBuilder, Direction
+    from Maze_Paths import bfs
+
+    builder = SimpleMazeBuilder(4, 4)
+    builder.build_maze()
+    builder.build_rooms(range(1, 17))
+    builder.build_doors([(room, room + 1) for room in range(1, 17) if room % 4] +
+                        [(room, room + 4) for room in range(1, 13)])
+    maze = builder.get_maze()
+    set_rectangle_doors(maze, 0, 0, 1, 1, True)
+    print(f"Open after the 2x2 corner: {count_open(maze)}, path 1 -> 6: {bfs(maze, 1, 6)}")
+    set_room_doors(maze, [6, 7, 11, 16], True)
+    print(f"Open after rooms 6, 7, 11, 16: {count_open(maze)}, path 1 -> 16: {bfs(maze, 1, 16)}")
+    door = maze.room_no(1).get_side(Direction.East)
+    door.is_open = False
+    print(f"Door {door.door_id} closed through its object: bit {maze.door_states[door.door_id]}, "
+          f"path 1 -> 6: {bfs(maze, 1, 6)}")
+    print()
+    benchmark(*map(int, sys.argv[1:2]))
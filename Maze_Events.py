@@ -0,0 +1,169 @@
+import json
+from abc import ABC, abstractmethod
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from enum import Enum
+
+
+class EventType(Enum):
+    ROOM_CREATED = "room_created"
+    ROOM_ENTERED = "room_entered"
+    WALL_CREATED = "wall_created"
+    WALL_HIT = "wall_hit"
+    WALL_DAMAGED = "wall_damaged"
+    DOOR_CREATED = "door_created"
+    DOOR_ENTERED = "door_entered"
+    BOMB_EXPLODED = "bomb_exploded"
+    LAMP_SWITCHED = "lamp_switched"
+    AGENTS_MOVED = "agents_moved"
+
+
+Event = namedtuple("Event", ["type", "fields"])
+
+
+class EventSink(ABC):
+    @abstractmethod
+    def write(self, event: Event):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class NullSink(EventSink):
+    def write(self, event: Event):
+        pass
+
+
+class RingBufferSink(EventSink):
+    def __init__(self, capacity=10_000):
+        self._events = deque(maxlen=capacity)
+
+    def write(self, event: Event):
+        self._events.append(event)
+
+    @property
+    def events(self):
+        return list(self._events)
+
+    def clear(self):
+        self._events.clear()
+
+
+class JsonlFileSink(EventSink):
+    def __init__(self, path, buffer_size=1024):
+        self._file = open(path, "a", encoding="utf-8")
+        self._buffer = []
+        self._buffer_size = buffer_size
+
+    def write(self, event: Event):
+        self._buffer.append(event)
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._file.write("".join(json.dumps({"event": event.type.value, **event.fields}) + "\n"
+                                     for event in self._buffer))
+            self._buffer.clear()
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def _room_created(fields):
+    if "spell" in fields:
+        return f"EnchantedRoom {fields['room']} is created with spell '{fields['spell']}'"
+    return None
+
+
+def _room_entered(fields):
+    if "spell" in fields:
+        return f"Entering enchanted room number {fields['room']} with spell {fields['spell']}"
+    if fields.get("bomb_exploded"):
+        return f"Entering room number {fields['room']}.\n!!!The bomb has exploded!!!"
+    if fields.get("has_bomb"):
+        return f"Entering room number {fields['room']} with a bomb!"
+    if "has_bomb" in fields:
+        # A bomb room whose bomb is gone without exploding, worded as RoomWithABomb.enter printed it
+        return f"entering room number {fields['room']}"
+    return f"Entering room number {fields['room']}"
+
+
+def _door_created(fields):
+    message = f"Door created between Room {fields['room_1']} and Room {fields['room_2']}"
+    if fields["kind"] == "DoorNeedingSpell":
+        message += f"\nDoor needing a spell created between Room {fields['room_1']} and Room {fields['room_2']}"
+    return message
+
+
+def _door_entered(fields):
+    door = "enchanted door" if fields["kind"] == "DoorNeedingSpell" else "door"
+    if fields["open"]:
+        return f"You pass through the {door}."
+    return f"The {door} is closed."
+
+
+class PrintSink(EventSink):
+    # Renders events as the console messages the demos used to print
+    _formats = {
+        EventType.ROOM_CREATED: _room_created,
+        EventType.ROOM_ENTERED: _room_entered,
+        EventType.WALL_CREATED: lambda fields: "Wall is created.",
+        EventType.WALL_HIT: lambda fields: "You hit a damaged wall." if fields["damaged"] else "You hit a wall.",
+        EventType.WALL_DAMAGED: lambda fields: "The wall is now damaged.",
+        EventType.DOOR_CREATED: _door_created,
+        EventType.DOOR_ENTERED: _door_entered,
+        EventType.BOMB_EXPLODED: lambda fields: f"The bomb in room number {fields['room']} has exploded!",
+        EventType.LAMP_SWITCHED: lambda fields: "Lamp is ON." if fields["on"] else "Lamp is OFF.",
+        EventType.AGENTS_MOVED: lambda fields: f"Tick {fields['tick']}: {len(fields['agents'])} agents moved, "
+                                               f"{len(fields['blocked_doors'])} stopped at closed doors.",
+    }
+
+    def write(self, event: Event):
+        message = self._formats[event.type](event.fields)
+        if message is not None:
+            print(message)
+
+
+class EventBus:
+    # Call sites check `bus.enabled` before building an event, so a bus
+    # without sinks costs one attribute lookup per would-be event.
+    def __init__(self):
+        self.enabled = False
+        self._sinks = []
+
+    def subscribe(self, sink: EventSink):
+        self._sinks.append(sink)
+        self.enabled = True
+        return sink
+
+    def unsubscribe(self, sink: EventSink):
+        self._sinks.remove(sink)
+        sink.flush()
+        self.enabled = bool(self._sinks)
+
+    def emit(self, event_type: EventType, **fields):
+        event = Event(event_type, fields)
+        for sink in self._sinks:
+            sink.write(event)
+
+    def flush(self):
+        for sink in self._sinks:
+            sink.flush()
+
+    @contextmanager
+    def capture(self, sink: EventSink):
+        self.subscribe(sink)
+        try:
+            yield sink
+        finally:
+            self.unsubscribe(sink)
+
+
+bus = EventBus()
@@ -0,0 +1,204 @@
+import random
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from time import perf_counter
+
+from Builder_Maze import SimpleMazeBuilder, CountingMazeBuilder
+from Maze_Compact import CompactMazeBuilder
+from Maze_Connectivity import DisjointSet
+from Maze_Grid import GridTopology, NORTH, SOUTH, EAST, WEST
+
+
+class MazeGenerator(ABC):
+    # Strategy: a generator yields the passages of a perfect maze over a width x height grid,
+    # and generate() streams them into a builder in chunks so no door list is ever held whole
+    def __init__(self, width, height, seed=None, chunk_size=65_536):
+        self.grid = GridTopology(width, height)
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.chunk_size = chunk_size
+
+    def generate(self, builder):
+        first_id, cells = self.grid.first_id, len(self.grid)
+        builder.grid = self.grid
+        builder.build_maze()
+        for start in range(0, cells, self.chunk_size):
+            builder.build_rooms(range(first_id + start, first_id + min(start + self.chunk_size, cells)))
+        pending = array('i')
+        for cell_from, cell_to in self.passages(random.Random(self.seed)):
+            pending.append(first_id + cell_from)
+            pending.append(first_id + cell_to)
+            if len(pending) >= 2 * self.chunk_size:
+                builder.build_doors(pending)
+                pending = array('i')
+        if pending:
+            builder.build_doors(pending)
+        return builder.get_maze()
+
+    @abstractmethod
+    def passages(self, rng):
+        # Yields (cell_from, cell_to) pairs of 0-based cell indexes, exactly cells - 1 of them
+        pass
+
+    def step(self, cell, side):
+        if side == NORTH:
+            return cell - self.width
+        if side == SOUTH:
+            return cell + self.width
+        if side == EAST:
+            return cell + 1
+        return cell - 1
+
+    def neighbors(self, cell):
+        width = self.width
+        x = cell % width
+        result = []
+        if cell >= width:
+            result.append(cell - width)
+        if cell < width * (self.height - 1):
+            result.append(cell + width)
+        if x < width - 1:
+            result.append(cell + 1)
+        if x > 0:
+            result.append(cell - 1)
+        return result
+
+    def sides(self, cell):
+        width = self.width
+        x = cell % width
+        result = []
+        if cell >= width:
+            result.append(NORTH)
+        if cell < width * (self.height - 1):
+            result.append(SOUTH)
+        if x < width - 1:
+            result.append(EAST)
+        if x > 0:
+            result.append(WEST)
+        return result
+
+
+class KruskalGenerator(MazeGenerator):
+    def passages(self, rng):
+        width, height = self.width, self.height
+        cells = width * height
+        # Edge 2c joins cell c to its east neighbour, edge 2c + 1 to its south neighbour
+        edges = array('i', [2 * cell for cell in range(cells) if cell % width < width - 1])
+        edges.extend(2 * cell + 1 for cell in range(width * (height - 1)))
+        rng.shuffle(edges)
+        sets = DisjointSet()
+        sets.add_range(range(cells))
+        union = sets.union
+        for edge in edges:
+            cell = edge >> 1
+            other = cell + width if edge & 1 else cell + 1
+            if union(cell, other):
+                yield cell, other
+                if sets.components == 1:
+                    return
+
+
+class PrimGenerator(MazeGenerator):
+    def passages(self, rng):
+        cells = self.width * self.height
+        # 0: untouched, 1: in the maze, 2: on the frontier
+        state = bytearray(cells)
+        randrange, neighbors = rng.randrange, self.neighbors
+        start = randrange(cells)
+        state[start] = 1
+        frontier = array('i')
+        for cell in neighbors(start):
+            state[cell] = 2
+            frontier.append(cell)
+        while frontier:
+            index = randrange(len(frontier))
+            cell = frontier[index]
+            frontier[index] = frontier[-1]
+            frontier.pop()
+            around = neighbors(cell)
+            inside = [other for other in around if state[other] == 1]
+            yield inside[randrange(len(inside))], cell
+            state[cell] = 1
+            for other in around:
+                if not state[other]:
+                    state[other] = 2
+                    frontier.append(other)
+
+
+class WilsonGenerator(MazeGenerator):
+    # Loop-erased random walks: uniform over all spanning trees. Each walk remembers only the
+    # last exit taken from every cell, so erasing loops needs no extra bookkeeping.
+    def passages(self, rng):
+        cells = self.width * self.height
+        in_tree = bytearray(cells)
+        exits = bytearray(cells)
+        randrange, sides, step = rng.randrange, self.sides, self.step
+        in_tree[randrange(cells)] = 1
+        for start in range(cells):
+            cell = start
+            while not in_tree[cell]:
+                options = sides(cell)
+                side = options[randrange(len(options))]
+                exits[cell] = side
+                cell = step(cell, side)
+            cell = start
+            while not in_tree[cell]:
+                in_tree[cell] = 1
+                other = step(cell, exits[cell])
+                yield cell, other
+                cell = other
+
+
+class BacktrackerGenerator(MazeGenerator):
+    # Recursive backtracker with an explicit stack, so depth is bounded by memory, not the interpreter
+    def passages(self, rng):
+        cells = self.width * self.height
+        visited = bytearray(cells)
+        randrange, neighbors = rng.randrange, self.neighbors
+        start = randrange(cells)
+        visited[start] = 1
+        stack = array('i', [start])
+        while stack:
+            cell = stack[-1]
+            options = [other for other in neighbors(cell) if not visited[other]]
+            if not options:
+                stack.pop()
+                continue
+            other = options[randrange(len(options))]
+            visited[other] = 1
+            stack.append(other)
+            yield cell, other
+
+
+GENERATORS = {
+    "kruskal": KruskalGenerator,
+    "prim": PrimGenerator,
+    "wilson": WilsonGenerator,
+    "backtracker": BacktrackerGenerator,
+}
+
+
+def benchmark(width=1000, height=1000, seed=1):
+    print(f"Generating a perfect {width}x{height} maze ({width * height} cells) into a CompactMaze:")
+    for name, generator_class in GENERATORS.items():
+        began = perf_counter()
+        maze = generator_class(width, height, seed).generate(CompactMazeBuilder())
+        elapsed = perf_counter() - began
+        print(f"  {name:<12} {elapsed:7.3f} s   doors {maze.door_count}   components {maze.component_count()}")
+        del maze
+
+
+# Example usage
+if __name__ == "__main__":
+    for name, generator_class in GENERATORS.items():
+        generator = generator_class(12, 8, seed=42)
+        maze = generator.generate(SimpleMazeBuilder())
+        dry_run = CountingMazeBuilder()
+        generator.generate(dry_run)
+        rooms, doors = dry_run.get_counts()
+        print(f"{name:<12} rooms {len(maze.rooms)}   doors {doors}   components {maze.component_count()}   "
+              f"same as dry run: {dry_run.get_maze().component_count() == maze.component_count()}")
+    print()
+    benchmark(*map(int, sys.argv[1:3]))
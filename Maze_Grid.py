@@ -0,0 +1,84 @@
+# Side indexes, in the order of Room._sides (Direction.value - 1)
+NORTH, SOUTH, EAST, WEST = 0, 1, 2, 3
+NOT_ADJACENT = 255
+
+# bytes.translate table mapping each side index to the side facing it
+OPPOSITE_SIDES = bytes([SOUTH, NORTH, WEST, EAST]) + bytes([NOT_ADJACENT]) * 252
+
+
+class GridTopology:
+    def __init__(self, width, height, first_id=1):
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Grid dimensions must be positive, got {width}x{height}.")
+        self.width = width
+        self.height = height
+        self.first_id = first_id
+
+    def __len__(self):
+        return self.width * self.height
+
+    def __contains__(self, room_no):
+        return 0 <= room_no - self.first_id < self.width * self.height
+
+    def __eq__(self, other):
+        return isinstance(other, GridTopology) and \
+            (self.width, self.height, self.first_id) == (other.width, other.height, other.first_id)
+
+    def __repr__(self):
+        return f"GridTopology({self.width}x{self.height}, first_id={self.first_id})"
+
+    def room_ids(self):
+        return range(self.first_id, self.first_id + self.width * self.height)
+
+    def coordinates(self, room_no):
+        if room_no not in self:
+            raise ValueError(f"Room {room_no} is not on the {self.width}x{self.height} grid.")
+        y, x = divmod(room_no - self.first_id, self.width)
+        return x, y
+
+    def room_at(self, x, y):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise ValueError(f"({x}, {y}) is not on the {self.width}x{self.height} grid.")
+        return self.first_id + y * self.width + x
+
+    def neighbor(self, room_no, side):
+        x, y = self.coordinates(room_no)
+        if side == NORTH:
+            return room_no - self.width if y > 0 else None
+        if side == SOUTH:
+            return room_no + self.width if y < self.height - 1 else None
+        if side == EAST:
+            return room_no + 1 if x < self.width - 1 else None
+        return room_no - 1 if x > 0 else None
+
+    def side_between(self, room_from, room_to):
+        (x1, y1), (x2, y2) = self.coordinates(room_from), self.coordinates(room_to)
+        if y1 == y2 and x2 == x1 + 1:
+            return EAST
+        if y1 == y2 and x2 == x1 - 1:
+            return WEST
+        if x1 == x2 and y2 == y1 + 1:
+            return SOUTH
+        if x1 == x2 and y2 == y1 - 1:
+            return NORTH
+        raise ValueError(f"Rooms {room_from} and {room_to} are not adjacent on the grid.")
+
+    def common_walls(self, rooms_from, rooms_to):
+        # Returns (sides_from, sides_to) as bytes of side indexes for a whole batch of door pairs
+        # and raises ValueError naming the first pair that does not share a wall
+        if not len(rooms_from):
+            return b"", b""
+        first, width = self.first_id, self.width
+        last = first + width * self.height - 1
+        steps = {1: EAST, -1: WEST, width: SOUTH, -width: NORTH}
+        sides_from = bytes([steps.get(room_to - room_from, NOT_ADJACENT)
+                            for room_from, room_to in zip(rooms_from, rooms_to)])
+        # A +-1 step is only a shared wall when it does not wrap around the end of a row
+        wraps = any(side == EAST and (room_from - first) % width == width - 1 or
+                    side == WEST and (room_from - first) % width == 0
+                    for side, room_from in zip(sides_from, rooms_from))
+        if wraps or NOT_ADJACENT in sides_from or min(rooms_from) < first or max(rooms_from) > last \
+                or min(rooms_to) < first or max(rooms_to) > last:
+            for room_from, room_to in zip(rooms_from, rooms_to):
+                self.side_between(room_from, room_to)
+        return sides_from, sides_from.translate(OPPOSITE_SIDES)
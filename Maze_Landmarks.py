@@ -0,0 +1,208 @@
+import os
+import random
+import struct
+import tempfile
+import zlib
+from array import array
+
+from Builder_Maze import SimpleMazeBuilder
+from Maze_DoorStates import door_state
+from Maze_Paths import adjacency_of, astar
+
+_MAGIC = b"MZLM"
+_VERSION = 2
+# magic, version, landmark count, rows, edges, crc32 of the neighbour array, include_closed, length of
+# the door state the tables were built over (0 when they include closed doors)
+_HEADER = struct.Struct("<4sHHiiIBi")
+
+
+def landmarks_path(maze_path):
+    return f"{maze_path}.landmarks"
+
+
+def _fingerprint(graph):
+    return len(graph), len(graph.neighbors), zlib.crc32(graph.neighbors.tobytes())
+
+
+def _distances(graph, source, include_closed):
+    offsets, neighbors, door_ids, door_open = graph.offsets, graph.neighbors, graph.door_ids, graph.door_open
+    distances = array('i', [-1]) * len(graph)
+    distances[source] = 0
+    frontier = [source]
+    distance = 0
+    while frontier:
+        distance += 1
+        next_frontier = []
+        for current in frontier:
+            for edge in range(offsets[current], offsets[current + 1]):
+                nxt = neighbors[edge]
+                if distances[nxt] < 0 and (include_closed or door_open[door_ids[edge]]):
+                    distances[nxt] = distance
+                    next_frontier.append(nxt)
+        frontier = next_frontier
+    return distances
+
+
+class LandmarkIndex:
+    # ALT (A*, landmarks, triangle inequality) tables: one BFS distance array per landmark row.
+    # doors is the door state the tables were built over, the doors open now when not given.
+    def __init__(self, maze, landmarks, tables, include_closed=False, doors=None):
+        self._maze = maze
+        self._graph = adjacency_of(maze)
+        self.landmarks = landmarks
+        self.tables = tables
+        self.include_closed = include_closed
+        if include_closed:
+            doors = b""
+        elif doors is None:
+            doors = door_state(self._graph.door_open)
+        self._doors = doors
+        # As an int, so doors opened since can be picked out with masks
+        self._door_state = int.from_bytes(doors, "little")
+        self._checked_version = self._covered = None
+
+    @classmethod
+    def build(cls, maze, count=8, seed=None, include_closed=False):
+        graph = adjacency_of(maze)
+        rng = random.Random(seed)
+        rooms = [number for number in graph.room_numbers if maze.room_no(number) is not None]
+        if not rooms:
+            raise ValueError("Cannot pick landmarks in an empty maze.")
+        # Farthest-point selection: each landmark is the room farthest from the ones already picked
+        seed_distances = _distances(graph, graph.row(rng.choice(rooms)), include_closed)
+        closest = seed_distances
+        landmarks, tables = array('i'), []
+        for _ in range(min(count, len(rooms))):
+            landmark = max(range(len(closest)), key=closest.__getitem__)
+            if closest[landmark] <= 0 and landmarks:
+                break
+            landmarks.append(landmark)
+            tables.append(_distances(graph, landmark, include_closed))
+            closest = array('i', map(min, closest, tables[-1]))
+        index = cls(maze, landmarks, tables, include_closed)
+        maze.landmarks = index
+        return index
+
+    def _row(self, room_number):
+        row = self._graph.row(room_number)
+        if row < 0:
+            raise ValueError(f"Room {room_number} is not in the maze.")
+        return row
+
+    def lower_bound(self, room_from, room_to):
+        row_from, row_to = self._row(room_from), self._row(room_to)
+        best = 0
+        for table in self.tables:
+            d_from, d_to = table[row_from], table[row_to]
+            if d_from >= 0 and d_to >= 0:
+                best = max(best, abs(d_from - d_to))
+        return best
+
+    def upper_bound(self, room_from, room_to):
+        # Length of the walk through the best landmark, or None if no landmark reaches both rooms
+        row_from, row_to = self._row(room_from), self._row(room_to)
+        candidates = [table[row_from] + table[row_to] for table in self.tables
+                      if table[row_from] >= 0 and table[row_to] >= 0]
+        return min(candidates) if candidates else None
+
+    def approximate_distance(self, room_from, room_to):
+        return self.upper_bound(room_from, room_to)
+
+    def heuristic(self, goal):
+        row_of = self._graph.row
+        goal_row = self._row(goal)
+        pairs = [(table, table[goal_row]) for table in self.tables if table[goal_row] >= 0]
+
+        def heuristic(room_number):
+            row = row_of(room_number)
+            best = 0
+            for table, to_goal in pairs:
+                distance = table[row]
+                if distance >= 0:
+                    distance = distance - to_goal if distance > to_goal else to_goal - distance
+                    if distance > best:
+                        best = distance
+            return best
+        return heuristic
+
+    def admissible(self, include_closed=False):
+        # Tables over every door never overestimate, whichever doors are open. Tables over the open
+        # doors only do so for searches through open doors, and only until another door opens.
+        if self.include_closed:
+            return True
+        if include_closed:
+            return False
+        # Rechecked only when the door states say they changed; byte per door tables without a
+        # version counter are rechecked every time
+        version = getattr(self._graph.door_open, "version", None)
+        if version is None or version != self._checked_version:
+            doors = int.from_bytes(door_state(self._graph.door_open), "little")
+            self._covered = not doors & ~self._door_state
+            self._checked_version = version
+        return self._covered
+
+    def shortest_path(self, start, goal):
+        # Plain A* once the tables could overestimate, so the path stays a shortest one
+        heuristic = self.heuristic(goal) if self.admissible(self.include_closed) else None
+        return astar(self._maze, start, goal, self.include_closed, heuristic)
+
+    def save(self, path):
+        rows, edges, checksum = _fingerprint(self._graph)
+        with open(path, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, _VERSION, len(self.landmarks), rows, edges, checksum,
+                                    self.include_closed, len(self._doors)))
+            self.landmarks.tofile(file)
+            for table in self.tables:
+                table.tofile(file)
+            file.write(self._doors)
+
+    @classmethod
+    def load(cls, path, maze):
+        graph = adjacency_of(maze)
+        with open(path, "rb") as file:
+            magic, version, count, rows, edges, checksum, include_closed, door_bytes = \
+                _HEADER.unpack(file.read(_HEADER.size))
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"{path} is not a version {_VERSION} landmark file.")
+            if (rows, edges, checksum) != _fingerprint(graph):
+                raise ValueError(f"{path} was computed for a different maze layout.")
+            landmarks = array('i')
+            landmarks.fromfile(file, count)
+            tables = []
+            for _ in range(count):
+                table = array('i')
+                table.fromfile(file, rows)
+                tables.append(table)
+            doors = file.read(door_bytes)
+        # Tables over the open doors only keep the door state they were built over, so doors opened
+        # between save and load turn the heuristic off rather than let it overestimate
+        if not include_closed and len(doors) != len(door_state(graph.door_open)):
+            raise ValueError(f"{path} was computed for a different door table.")
+        index = cls(maze, landmarks, tables, bool(include_closed), doors)
+        maze.landmarks = index
+        return index
+
+
+# Example usage
+if __name__ == "__main__":
+    width, height = 60, 40
+    builder = SimpleMazeBuilder(width, height)
+    builder.build_maze()
+    builder.build_rooms(range(1, width * height + 1))
+    # A comb: every column is open, but rows only connect along the top edge
+    builder.build_doors([(room, room + width) for room in range(1, width * (height - 1) + 1)] +
+                        [(room, room + 1) for room in range(1, width)])
+    maze = builder.get_maze()
+
+    index = LandmarkIndex.build(maze, count=6, seed=7, include_closed=True)
+    start, goal = width * (height - 1) + 1, width * height
+    path = index.shortest_path(start, goal)
+    print(f"Landmark rooms: {[maze.adjacency().room_numbers[row] for row in index.landmarks]}")
+    print(f"Exact distance {len(path) - 1}, bounds [{index.lower_bound(start, goal)}, "
+          f"{index.upper_bound(start, goal)}]")
+
+    with tempfile.TemporaryDirectory() as directory:
+        table_path = landmarks_path(os.path.join(directory, "comb.maze"))
+        index.save(table_path)
+        reloaded = LandmarkIndex.load(table_path, maze)
+        print(f"Reloaded approximate distance: {reloaded.approximate_distance(start, goal)}")
@@ -0,0 +1,172 @@
+from collections import OrderedDict
+
+from AbstractFactory_Maze import (Direction, Door, BombedWall, RoomWithABomb, MazeFactory, BombedMazeFactory,
+                                  wall_pool)
+from Maze_Events import bus, PrintSink
+
+_MASK = (1 << 64) - 1
+_DIRECTIONS = list(Direction)
+_OPPOSITE = {Direction.North: Direction.South, Direction.South: Direction.North,
+             Direction.East: Direction.West, Direction.West: Direction.East}
+
+
+def _mix(seed, room_low, room_high):
+    # splitmix64 finaliser over the seed and both room numbers: the same wall always rolls the same value
+    value = (seed * 0x9E3779B97F4A7C15 + room_low * 0xBF58476D1CE4E5B9 + room_high * 0x94D049BB133111EB) & _MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK
+    return value ^ (value >> 31)
+
+
+def random_doors(probability=0.5):
+    # Generation rule: rule(seed, room_low, room_high) says whether the wall between two neighbours is a door
+    threshold = int(probability * (1 << 64))
+
+    def rule(seed, room_low, room_high):
+        return _mix(seed, room_low, room_high) < threshold
+    return rule
+
+
+class LazyMaze:
+    # Rooms of a width-wide grid (height=None grows without bound) are built by the factory on first
+    # touch and kept in an LRU cache. State that differs from what generation produces is saved to
+    # small overlays on eviction and reapplied when the room is built again.
+    def __init__(self, factory: MazeFactory, width, height=None, seed=0, rule=None, capacity=4096):
+        if width <= 0 or (height is not None and height <= 0) or capacity <= 0:
+            raise ValueError("LazyMaze needs a positive width, height and capacity.")
+        self.factory = factory
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.rule = rule or random_doors()
+        self.capacity = capacity
+        self.rooms = OrderedDict()
+        # room number -> (bomb_exploded, bitmask of damaged wall sides)
+        self.room_overlay = {}
+        # (room_low, room_high) -> is_open for doors whose state differs from a fresh door
+        self.door_overlay = {}
+
+    def __contains__(self, room_number):
+        if room_number < 1:
+            return False
+        return self.height is None or room_number <= self.width * self.height
+
+    def neighbor(self, room_number, direction: Direction):
+        index = room_number - 1
+        x = index % self.width
+        if direction == Direction.North:
+            other = room_number - self.width if index >= self.width else None
+        elif direction == Direction.South:
+            other = room_number + self.width
+        elif direction == Direction.East:
+            other = room_number + 1 if x < self.width - 1 else None
+        else:
+            other = room_number - 1 if x > 0 else None
+        return other if other is not None and other in self else None
+
+    def has_door(self, room_number, direction: Direction):
+        other = self.neighbor(room_number, direction)
+        if other is None:
+            return False
+        return self.rule(self.seed, min(room_number, other), max(room_number, other))
+
+    def room_no(self, room_number):
+        room = self.rooms.get(room_number)
+        if room is not None:
+            self.rooms.move_to_end(room_number)
+            return room
+        if room_number not in self:
+            return None
+        room = self._materialize(room_number)
+        self.rooms[room_number] = room
+        while len(self.rooms) > self.capacity:
+            self._evict(*self.rooms.popitem(last=False))
+        return room
+
+    def go(self, room_number, direction: Direction):
+        # The room behind a door, built if needed; the door's far end is bound once both rooms exist
+        if not self.has_door(room_number, direction):
+            return None
+        return self.room_no(self.neighbor(room_number, direction))
+
+    def _materialize(self, room_number):
+        factory = self.factory
+        room = factory.make_room(room_number)
+        for direction in _DIRECTIONS:
+            if not self.has_door(room_number, direction):
+                room.set_side(direction, factory.shared_wall())
+                continue
+            other_number = self.neighbor(room_number, direction)
+            other = self.rooms.get(other_number)
+            if other is not None:
+                door = other.get_side(_OPPOSITE[direction])
+                if door.room_1 is not None and door.room_1.room_number == room_number:
+                    door.room_1 = room
+                else:
+                    door.room_2 = room
+            else:
+                door = factory.make_door(room, None)
+                door.is_open = self.door_overlay.get(_door_key(room_number, other_number), door.is_open)
+            room.set_side(direction, door)
+        state = self.room_overlay.get(room_number)
+        if state is not None:
+            bomb_exploded, damaged = state
+            if bomb_exploded:
+                room.bomb_exploded = True
+            for index in range(4):
+                if damaged & (1 << index):
+                    # Restored without events, as the damage was reported before eviction: unshare() copies
+                    # the pooled wall without WALL_CREATED and setting is_damaged skips WALL_DAMAGED
+                    wall = room._sides[index].unshare()
+                    wall.is_damaged = True
+                    room._sides[index] = wall
+        return room
+
+    def _evict(self, room_number, room):
+        damaged = 0
+        for index, (direction, side) in enumerate(zip(_DIRECTIONS, room._sides)):
+            if isinstance(side, BombedWall) and side.is_damaged:
+                damaged |= 1 << index
+            elif isinstance(side, Door):
+                key = _door_key(room_number, self.neighbor(room_number, direction))
+                if side.is_open:
+                    self.door_overlay[key] = True
+                else:
+                    self.door_overlay.pop(key, None)
+        bomb_exploded = isinstance(room, RoomWithABomb) and room.bomb_exploded
+        if bomb_exploded or damaged:
+            self.room_overlay[room_number] = (bomb_exploded, damaged)
+        else:
+            self.room_overlay.pop(room_number, None)
+
+    def flush(self):
+        # Writes the state of every cached room to the overlays without evicting anything
+        for room_number, room in self.rooms.items():
+            self._evict(room_number, room)
+
+
+def _door_key(room_a, room_b):
+    return (room_a, room_b) if room_a < room_b else (room_b, room_a)
+
+
+# Example usage
+if __name__ == "__main__":
+    maze = LazyMaze(BombedMazeFactory(), width=1_000_000, seed=7, rule=random_doors(0.6), capacity=3)
+    room = maze.room_no(1)
+    room.explode_bomb()
+    room.damage_wall(Direction.North)
+    direction = next((direction for direction in _DIRECTIONS if maze.has_door(1, direction)), None)
+    if direction is not None:
+        room.get_side(direction).is_open = True
+        print(f"Opened the door {direction.name} of room 1")
+    for room_number in range(2, 10):
+        maze.room_no(room_number)
+    print(f"Cached rooms {list(maze.rooms)}, overlays {maze.room_overlay} {maze.door_overlay}")
+
+    bus.subscribe(PrintSink())
+    room = maze.room_no(1)
+    room.enter()
+    room.get_side(Direction.North).enter()
+    if direction is not None:
+        room.get_side(direction).enter()
+    print(f"Distinct wall instances in the pool: {len(wall_pool)}")
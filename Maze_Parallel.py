@@ -0,0 +1,140 @@
+import os
+import random
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from Builder_Maze import SimpleMazeBuilder, EnchantedMazeBuilder, BombedMazeBuilder, DoorNeedingSpell, split_door_pairs
+from Maze_Compact import CompactMaze, DOOR_PLAIN, DOOR_SPELL
+from Maze_DoorStates import DoorBytes
+from Maze_Generators import KruskalGenerator
+
+_ARRAYS = ("room_kinds", "room_spells", "room_state", "sides", "door_rooms", "door_kinds", "door_spells",
+           "door_open")
+
+
+def _build_shard(builder_class, width, height, rooms, pairs):
+    # Runs in a worker: a real builder makes the shard's rooms and inner doors, then it is flattened for the trip back
+    builder = builder_class(width, height)
+    builder.build_maze()
+    builder.build_rooms(rooms)
+    builder.build_doors(pairs)
+    compact = CompactMaze.from_maze(builder.get_maze())
+    return [getattr(compact, name) for name in _ARRAYS] + [compact.spells]
+
+
+def _door_kind(builder):
+    door = builder.make_door(None, None)
+    return (DOOR_SPELL, door.spell) if isinstance(door, DoorNeedingSpell) else (DOOR_PLAIN, None)
+
+
+def canonicalize(maze):
+    # Renumbers doors in order of first appearance while scanning rooms and sides, which is
+    # the order CompactMaze.from_maze assigns, so mazes built in any order compare equal
+    sides, count = maze.sides, maze.door_count
+    new_ids = array('i', [-1]) * count
+    order = array('i')
+    for value in sides:
+        if value >= 0 and new_ids[value] < 0:
+            new_ids[value] = len(order)
+            order.append(value)
+    maze.sides = array('i', [new_ids[value] if value >= 0 else value for value in sides])
+    door_rooms = maze.door_rooms
+    maze.door_rooms = array('i', [door_rooms[2 * door_id + end] for door_id in order for end in (0, 1)])
+    maze.door_kinds = array('B', [maze.door_kinds[door_id] for door_id in order])
+    maze.door_spells = array('i', [maze.door_spells[door_id] for door_id in order])
+    maze.door_open = DoorBytes(maze.door_open[door_id] for door_id in order)
+    maze.topology_changed()
+    return maze
+
+
+def _merge(shards, first_id):
+    maze = CompactMaze(first_id)
+    for room_kinds, room_spells, room_state, sides, door_rooms, door_kinds, door_spells, door_open, spells in shards:
+        spell_ids = [maze.intern_spell(spell) for spell in spells]
+        first_door = maze.door_count
+        maze.room_kinds.extend(room_kinds)
+        maze.room_spells.extend(spell_ids[spell] if spell >= 0 else -1 for spell in room_spells)
+        maze.room_state.extend(room_state)
+        maze.sides.extend(value + first_door if value >= 0 else value for value in sides)
+        maze.door_rooms.extend(door_rooms)
+        maze.door_kinds.extend(door_kinds)
+        maze.door_spells.extend(spell_ids[spell] if spell >= 0 else -1 for spell in door_spells)
+        maze.door_open.extend(door_open)
+        maze.room_count += sum(1 for kind in room_kinds if kind)
+    maze._components = None
+    return maze
+
+
+def build_serial(builder_class, width, height, pairs):
+    builder = builder_class(width, height)
+    builder.build_maze()
+    builder.build_rooms(range(1, width * height + 1))
+    builder.build_doors(pairs)
+    return CompactMaze.from_maze(builder.get_maze())
+
+
+def build_parallel(builder_class, width, height, pairs, shards=None, executor=None):
+    # Rooms 1..width*height are split into contiguous shards. Doors inside a shard are built by its
+    # worker; doors crossing shards are stitched into the merged maze afterwards. Each side is
+    # expected to receive at most one door, as in every generated maze.
+    shards = shards or os.cpu_count() or 1
+    rooms = width * height
+    shard_size = -(-rooms // shards)
+    ranges = [range(start, min(start + shard_size, rooms + 1)) for start in range(1, rooms + 1, shard_size)]
+    inner = [array('i') for _ in ranges]
+    cross_from, cross_to = array('i'), array('i')
+    rooms_from, rooms_to = split_door_pairs(pairs)
+    for room_from, room_to in zip(rooms_from, rooms_to):
+        shard = (room_from - 1) // shard_size
+        if shard == (room_to - 1) // shard_size:
+            inner[shard].append(room_from)
+            inner[shard].append(room_to)
+        else:
+            cross_from.append(room_from)
+            cross_to.append(room_to)
+    jobs = [(builder_class, width, height, shard_rooms, shard_pairs)
+            for shard_rooms, shard_pairs in zip(ranges, inner)]
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            results = list(pool.map(_build_shard, *zip(*jobs)))
+    else:
+        results = list(executor.map(_build_shard, *zip(*jobs)))
+    maze = _merge(results, 1)
+    stitcher = builder_class(width, height)
+    sides_from, sides_to = stitcher.door_sides(cross_from, cross_to)
+    maze.add_doors(cross_from, cross_to, sides_from, sides_to, *_door_kind(stitcher))
+    maze.grid = stitcher.grid
+    return canonicalize(maze)
+
+
+def same_maze(a, b):
+    return all(getattr(a, name) == getattr(b, name) for name in _ARRAYS) and list(a.spells) == list(b.spells)
+
+
+def benchmark(width=1000, height=1000, workers=None):
+    workers = workers or os.cpu_count() or 1
+    pairs = array('i')
+    for cell_from, cell_to in KruskalGenerator(width, height).passages(random.Random(5)):
+        pairs.append(cell_from + 1)
+        pairs.append(cell_to + 1)
+    print(f"Building a {width}x{height} maze ({width * height} rooms) on {os.cpu_count()} cores:")
+    for builder_class in (SimpleMazeBuilder, EnchantedMazeBuilder, BombedMazeBuilder):
+        began = perf_counter()
+        serial = build_serial(builder_class, width, height, pairs)
+        serial_time = perf_counter() - began
+        began = perf_counter()
+        parallel = build_parallel(builder_class, width, height, pairs, workers)
+        parallel_time = perf_counter() - began
+        print(f"  {builder_class.__name__:<22} serial {serial_time:7.3f} s   {workers} shards {parallel_time:7.3f} s   "
+              f"speedup {serial_time / parallel_time:5.2f}x   identical {same_maze(serial, parallel)}")
+        del serial, parallel
+
+
+# Example usage
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        benchmark(*map(int, sys.argv[1:4]))
+    else:
+        benchmark(300, 300, 4)
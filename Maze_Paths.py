@@ -0,0 +1,190 @@
+import sys
+from array import array
+from heapq import heappush, heappop
+from time import perf_counter
+
+from Builder_Maze import SimpleMazeBuilder, build_adjacency
+from Maze_Compact import CompactMazeBuilder
+
+
+def adjacency_of(maze):
+    # Mazes that cache a CSR index hand it out; other maze modules get one built on the fly
+    if hasattr(maze, "adjacency"):
+        return maze.adjacency()
+    return build_adjacency(maze.rooms)
+
+
+def _rows(maze, graph, *room_numbers):
+    rows = []
+    for room_number in room_numbers:
+        row = graph.row(room_number)
+        if row < 0 or maze.room_no(room_number) is None:
+            raise ValueError(f"Room {room_number} is not in the maze.")
+        rows.append(row)
+    return rows
+
+
+def _walk_back(graph, parents, row):
+    path = [graph.room_numbers[row]]
+    while parents[row] != row:
+        row = parents[row]
+        path.append(graph.room_numbers[row])
+    return path
+
+
+def bfs(maze, start, goal, include_closed=False):
+    graph = adjacency_of(maze)
+    source, target = _rows(maze, graph, start, goal)
+    offsets, neighbors, door_ids, door_open = graph.offsets, graph.neighbors, graph.door_ids, graph.door_open
+    parents = array('i', [-1]) * len(graph)
+    parents[source] = source
+    queue = [source]
+    head = 0
+    while head < len(queue):
+        current = queue[head]
+        head += 1
+        if current == target:
+            return _walk_back(graph, parents, target)[::-1]
+        for edge in range(offsets[current], offsets[current + 1]):
+            nxt = neighbors[edge]
+            if parents[nxt] < 0 and (include_closed or door_open[door_ids[edge]]):
+                parents[nxt] = current
+                queue.append(nxt)
+    return None
+
+
+def bidirectional_bfs(maze, start, goal, include_closed=False):
+    graph = adjacency_of(maze)
+    source, target = _rows(maze, graph, start, goal)
+    if source == target:
+        return [start]
+    offsets, neighbors, door_ids, door_open = graph.offsets, graph.neighbors, graph.door_ids, graph.door_open
+    forward = array('i', [-1]) * len(graph)
+    backward = array('i', [-1]) * len(graph)
+    forward[source] = source
+    backward[target] = target
+    forward_frontier, backward_frontier = [source], [target]
+    while forward_frontier and backward_frontier:
+        # Expand one whole level of the smaller side so the first meeting level is the shortest
+        if len(forward_frontier) <= len(backward_frontier):
+            frontier, parents, other = forward_frontier, forward, backward
+        else:
+            frontier, parents, other = backward_frontier, backward, forward
+        next_frontier = []
+        meeting = -1
+        for current in frontier:
+            for edge in range(offsets[current], offsets[current + 1]):
+                nxt = neighbors[edge]
+                if parents[nxt] < 0 and (include_closed or door_open[door_ids[edge]]):
+                    parents[nxt] = current
+                    next_frontier.append(nxt)
+                    if meeting < 0 and other[nxt] >= 0:
+                        meeting = nxt
+        if meeting >= 0:
+            return _walk_back(graph, forward, meeting)[::-1] + _walk_back(graph, backward, meeting)[1:]
+        if parents is forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+    return None
+
+
+def manhattan_heuristic(grid, goal):
+    goal_x, goal_y = grid.coordinates(goal)
+    first_id, width = grid.first_id, grid.width
+
+    def heuristic(room_number):
+        y, x = divmod(room_number - first_id, width)
+        return abs(x - goal_x) + abs(y - goal_y)
+    return heuristic
+
+
+def astar(maze, start, goal, include_closed=False, heuristic=None):
+    graph = adjacency_of(maze)
+    source, target = _rows(maze, graph, start, goal)
+    if heuristic is None:
+        grid = getattr(maze, "grid", None)
+        heuristic = manhattan_heuristic(grid, goal) if grid is not None else (lambda room_number: 0)
+    offsets, neighbors, door_ids, door_open = graph.offsets, graph.neighbors, graph.door_ids, graph.door_open
+    room_numbers = graph.room_numbers
+    parents = {source: source}
+    costs = {source: 0}
+    # Ties on f are broken towards the deeper entry, so open areas do not expand level by level
+    heap = [(heuristic(start), 0, source)]
+    while heap:
+        _, cost, current = heappop(heap)
+        cost = -cost
+        if current == target:
+            return _walk_back(graph, parents, target)[::-1]
+        if cost > costs[current]:
+            continue
+        cost += 1
+        for edge in range(offsets[current], offsets[current + 1]):
+            nxt = neighbors[edge]
+            if cost < costs.get(nxt, cost + 1) and (include_closed or door_open[door_ids[edge]]):
+                costs[nxt] = cost
+                parents[nxt] = current
+                heappush(heap, (cost + heuristic(room_numbers[nxt]), -cost, nxt))
+    return None
+
+
+def shortest_path(maze, start, goal, include_closed=False):
+    landmarks = getattr(maze, "landmarks", None)
+    if landmarks is not None and landmarks.admissible(include_closed):
+        return astar(maze, start, goal, include_closed, landmarks.heuristic(goal))
+    if getattr(maze, "grid", None) is not None:
+        return astar(maze, start, goal, include_closed)
+    return bidirectional_bfs(maze, start, goal, include_closed)
+
+
+def _open_grid_maze(builder, width, height):
+    rooms = range(1, width * height + 1)
+    builder.build_maze()
+    builder.build_rooms(rooms)
+    builder.build_doors([(room, room + 1) for room in rooms if room % width] +
+                        [(room, room + width) for room in range(1, width * (height - 1) + 1)])
+    maze = builder.get_maze()
+    if hasattr(maze, "door_open"):
+        maze.door_open[:] = b"\x01" * len(maze.door_open)
+    else:
+        for room in maze.rooms.values():
+            for side in room._sides:
+                if hasattr(side, "is_open"):
+                    side.is_open = True
+    return maze
+
+
+def benchmark(width=1000, height=1000):
+    start, goal = 1, width * height
+    print(f"Corner to corner on an open {width}x{height} grid ({width * height} rooms):")
+    for label, builder in (("Maze", SimpleMazeBuilder(width, height)),
+                           ("CompactMaze", CompactMazeBuilder(width=width, height=height))):
+        maze = _open_grid_maze(builder, width, height)
+        began = perf_counter()
+        maze.adjacency()
+        print(f"  {label:<12} {'adjacency index':<18} {perf_counter() - began:7.3f} s")
+        for search in (bfs, bidirectional_bfs, astar):
+            began = perf_counter()
+            path = search(maze, start, goal)
+            elapsed = perf_counter() - began
+            print(f"  {label:<12} {search.__name__:<18} {elapsed:7.3f} s   path length {len(path) - 1}")
+        del maze
+
+
+# Example usage
+if __name__ == "__main__":
+    maze_builder = SimpleMazeBuilder(3, 3)
+    maze_builder.build_maze()
+    maze_builder.build_rooms(range(1, 10))
+    maze_builder.build_doors([(1, 2), (2, 3), (3, 6), (6, 9), (1, 4), (4, 7), (7, 8)])
+    maze = maze_builder.get_maze()
+    print("Path with every door closed:", bfs(maze, 1, 9))
+    for room in maze.rooms.values():
+        for side in room._sides:
+            if hasattr(side, "is_open"):
+                side.is_open = True
+    print("BFS path:", bfs(maze, 1, 9))
+    print("Bidirectional BFS path:", bidirectional_bfs(maze, 1, 9))
+    print("A* path:", astar(maze, 1, 9))
+    print()
+    benchmark(*map(int, sys.argv[1:3]))
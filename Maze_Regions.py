@@ -0,0 +1,227 @@
+import sys
+from array import array
+from time import perf_counter
+
+from Builder_Maze import Direction
+from Maze_Compact import (CompactMaze, CompactMazeBuilder, ROOM_PLAIN, ROOM_ENCHANTED, ROOM_BOMBED, SIDE_WALL,
+                          SIDE_BOMBED_WALL, DOOR_PLAIN, DOOR_SPELL)
+from Maze_Grid import GridTopology
+
+
+def _repeat(target, value, count):
+    return (array(target.typecode, [value]) if isinstance(target, array) else bytes([value])) * count
+
+
+class RegionPrototype:
+    # A cluster of rooms with their walls and internal doors, kept as flat tables indexed by local row
+    # (room number minus the cluster's lowest room number). Doors that led out of the cluster become
+    # walls of the kind the room already has (bombed walls in a bombed maze), or edge_wall when given.
+    # Local rows the cluster does not use are holes and leave the target maze untouched.
+    def __init__(self, kinds, spells, state, sides, door_ends, door_kinds, door_spells, door_open):
+        self.kinds = kinds
+        self.spells = spells
+        self.state = state
+        self.sides = sides
+        self.door_ends = door_ends
+        self.door_kinds = door_kinds
+        self.door_spells = door_spells
+        self.door_open = door_open
+        self.span = len(kinds)
+        self.used_rows = [row for row, kind in enumerate(kinds) if kind]
+        self.door_count = len(door_kinds)
+
+    @classmethod
+    def capture(cls, maze, room_numbers, edge_wall=None):
+        if not isinstance(maze, CompactMaze):
+            maze = CompactMaze.from_maze(maze)
+        rows = sorted({maze._row(room_number) for room_number in room_numbers})
+        if not rows or rows[0] < 0:
+            raise ValueError("A region needs rooms that are all in the maze.")
+        base, span = rows[0], rows[-1] - rows[0] + 1
+        kinds, state = array('B', bytes(span)), bytearray(span)
+        spells, sides = [None] * span, array('i', [-1]) * (4 * span)
+        door_ids, door_ends, door_kinds, door_spells, door_open = {}, array('i'), array('B'), [], bytearray()
+        inside = set(rows)
+        for row in rows:
+            local = row - base
+            kinds[local] = maze.room_kinds[row]
+            spell_id = maze.room_spells[row]
+            spells[local] = maze.spells[spell_id] if spell_id >= 0 else None
+            state[local] = maze.room_state[row]
+            wall = edge_wall
+            if wall is None:
+                walls = [value for value in maze.sides[4 * row:4 * row + 4] if value in (SIDE_WALL, SIDE_BOMBED_WALL)]
+                wall = walls[0] if walls else SIDE_BOMBED_WALL if kinds[local] == ROOM_BOMBED else SIDE_WALL
+            for index in range(4):
+                value = maze.sides[4 * row + index]
+                if value >= 0:
+                    ends = [room - maze.first_id for room in maze.door_rooms[2 * value:2 * value + 2]]
+                    if ends[0] in inside and ends[1] in inside:
+                        if value not in door_ids:
+                            door_ids[value] = len(door_kinds)
+                            door_ends.extend(end - base for end in ends)
+                            door_kinds.append(maze.door_kinds[value])
+                            spell_id = maze.door_spells[value]
+                            door_spells.append(maze.spells[spell_id] if spell_id >= 0 else None)
+                            door_open.append(maze.door_open[value])
+                        value = door_ids[value]
+                    else:
+                        value = wall
+                sides[4 * local + index] = value
+        return cls(kinds, spells, bytes(state), sides, door_ends, door_kinds, door_spells, bytes(door_open))
+
+    def _check_free(self, maze, rows):
+        # Runs before the maze grows, so rows past its end are free
+        kinds = maze.room_kinds
+        size = len(kinds)
+        if isinstance(rows, range):
+            for local in self.used_rows:
+                if any(kinds[rows.start + local:rows.stop + local:rows.step]):
+                    raise ValueError("A stamp would overwrite rooms that are already in the maze.")
+            return
+        claimed = set()
+        for row in rows:
+            for local in self.used_rows:
+                if (row + local < size and kinds[row + local]) or row + local in claimed:
+                    raise ValueError(f"A stamp at room {row + maze.first_id} would overwrite an existing room.")
+                claimed.add(row + local)
+
+    def stamp(self, maze, offsets):
+        # Stamps the region with its lowest room at every room number in offsets and returns the ids of
+        # the new doors, D per stamp in offsets order. A range of offsets spaced at least a span apart
+        # is written with one strided slice per local row, side and door end however many stamps it
+        # holds; any other sequence of offsets costs a few slice writes per stamp.
+        span = self.span
+        if not (isinstance(offsets, range) and offsets.step >= span):
+            offsets = list(offsets)
+        count = len(offsets)
+        first_door = maze.door_count
+        if not count:
+            return range(first_door, first_door)
+        if isinstance(offsets, range):
+            rows = range(offsets.start - maze.first_id, offsets.stop - maze.first_id, offsets.step)
+            lowest, highest = rows[0], rows[-1]
+        else:
+            rows = [offset - maze.first_id for offset in offsets]
+            lowest, highest = min(rows), max(rows)
+        if lowest < 0:
+            raise ValueError(f"Cannot stamp below the first room number {maze.first_id}.")
+        # Checked before growing, so a rejected stamp leaves the maze and its caches untouched
+        self._check_free(maze, rows)
+        maze._grow(highest + span)
+        room_spells = [maze.intern_spell(spell) for spell in self.spells]
+        door_spells = array('i', [maze.intern_spell(spell) for spell in self.door_spells])
+        if isinstance(rows, range) and isinstance(maze.sides, array):
+            self._stamp_strided(maze, rows, room_spells, door_spells, first_door)
+        else:
+            self._stamp_each(maze, rows, room_spells, door_spells, first_door)
+        maze.room_count += count * len(self.used_rows)
+        maze._components = None
+        return range(first_door, maze.door_count)
+
+    def _stamp_strided(self, maze, rows, room_spells, door_spells, first_door):
+        count, step, doors, first_id = len(rows), rows.step, self.door_count, maze.first_id
+        start, stop = rows.start, rows.start + count * step
+        for local in self.used_rows:
+            target = slice(start + local, stop + local, step)
+            maze.room_kinds[target] = _repeat(maze.room_kinds, self.kinds[local], count)
+            maze.room_spells[target] = _repeat(maze.room_spells, room_spells[local], count)
+            maze.room_state[target] = _repeat(maze.room_state, self.state[local], count)
+            for index in range(4):
+                value = self.sides[4 * local + index]
+                if value >= 0:
+                    values = array('i', range(first_door + value, first_door + value + count * doors, doors))
+                else:
+                    values = array('i', [value]) * count
+                maze.sides[4 * (start + local) + index:4 * (stop + local) + index:4 * step] = values
+        door_rooms = array('i', bytes(8 * doors * count))
+        for end, local in enumerate(self.door_ends):
+            door_rooms[end::2 * doors] = array('i', range(first_id + start + local, first_id + stop + local, step))
+        maze.topology_changed()
+        maze.door_rooms.extend(door_rooms)
+        maze.door_kinds.extend(self.door_kinds * count)
+        maze.door_spells.extend(door_spells * count)
+        maze.door_open.extend(self.door_open * count)
+
+    def _stamp_each(self, maze, rows, room_spells, door_spells, first_door):
+        doors, first_id = self.door_count, maze.first_id
+        template = [(local, self.kinds[local], room_spells[local], self.state[local],
+                     self.sides[4 * local:4 * local + 4]) for local in self.used_rows]
+        door_ends = self.door_ends
+        maze.topology_changed()
+        for stamp, row in enumerate(rows):
+            base = first_door + stamp * doors
+            for local, kind, spell, state, sides in template:
+                maze.room_kinds[row + local] = kind
+                maze.room_spells[row + local] = spell
+                maze.room_state[row + local] = state
+                maze.sides[4 * (row + local):4 * (row + local) + 4] = \
+                    array('i', [value + base if value >= 0 else value for value in sides])
+            maze.door_rooms.extend(array('i', [first_id + row + local for local in door_ends]))
+        count = len(rows)
+        maze.door_kinds.extend(self.door_kinds * count)
+        maze.door_spells.extend(door_spells * count)
+        maze.door_open.extend(self.door_open * count)
+
+    def stitch(self, maze, offsets_from, offsets_to, local_from, direction_from: Direction, local_to,
+               direction_to: Direction, kind=DOOR_PLAIN, spell=None):
+        # Doors from local room local_from of each stamp in offsets_from to local_to of the matching stamp
+        # in offsets_to, replacing the walls on those sides; returns the new door ids
+        rooms_from = [offset + local_from for offset in offsets_from]
+        rooms_to = [offset + local_to for offset in offsets_to]
+        count = len(rooms_from)
+        return maze.add_doors(rooms_from, rooms_to, bytes([direction_from.value - 1]) * count,
+                              bytes([direction_to.value - 1]) * count, kind, spell)
+
+
+def _cluster(width):
+    # 2x2 block in the top-left corner of a grid `width` rooms wide (the width of the grid it will be
+    # stamped into), with doors top-left to top-right, top-left to bottom-left and a spell door on the right
+    builder = CompactMazeBuilder(width=width, height=2)
+    builder.build_maze()
+    maze = builder.get_maze()
+    rooms = (1, 2, width + 1, width + 2)
+    for room_number in rooms:
+        enchanted = room_number == width + 2
+        maze.add_room(room_number, ROOM_ENCHANTED if enchanted else ROOM_PLAIN, "A mysterious spell" if enchanted else None)
+    maze.add_door(1, 2, Direction.East, Direction.West)
+    maze.add_door(1, width + 1, Direction.South, Direction.North)
+    maze.add_door(2, width + 2, Direction.South, Direction.North, DOOR_SPELL, "A mysterious spell")
+    return RegionPrototype.capture(maze, rooms)
+
+
+def benchmark(stamps=100_000):
+    # Clusters side by side along a strip two rooms wide
+    region = _cluster(2)
+    for label, make_offsets in (("strided", lambda: range(1, 4 * stamps, 4)),
+                                ("one by one", lambda: [1 + 4 * stamp for stamp in range(stamps)])):
+        maze = CompactMaze()
+        offsets = make_offsets()
+        began = perf_counter()
+        region.stamp(maze, offsets)
+        elapsed = perf_counter() - began
+        print(f"  {label:<10} {stamps} stamps ({maze.room_count} rooms, {maze.door_count} doors) in "
+              f"{elapsed * 1000:7.1f} ms   {stamps / elapsed:12,.0f} stamps/s")
+
+
+# Example usage
+if __name__ == "__main__":
+    from Prototype_Maze import PrototypeManager
+
+    manager = PrototypeManager()
+    manager.register_prototype("cluster", _cluster(10))
+    # Tile a 10x10 grid with 25 clusters, then stitch each to its east and south neighbours
+    level = CompactMaze()
+    level.grid = GridTopology(10, 10)
+    offsets = [1 + 2 * x + 20 * y for y in range(5) for x in range(5)]
+    manager.stamp("cluster", level, offsets)
+    region = manager.get_prototype("cluster")
+    east = [offset for offset in offsets if (offset - 1) % 10 < 8]
+    south = [offset for offset in offsets if offset <= 80]
+    region.stitch(level, east, [offset + 2 for offset in east], 1, Direction.East, 0, Direction.West)
+    region.stitch(level, south, [offset + 20 for offset in south], 10, Direction.South, 0, Direction.North)
+    print(f"Stamped level: {level.room_count} rooms, {level.door_count} doors, "
+          f"{level.component_count()} connected component(s); room 66: {level.room_no(66)}")
+    print()
+    print("Stamping a 4-room cluster:")
+    benchmark(*map(int, sys.argv[1:2]))
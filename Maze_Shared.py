@@ -0,0 +1,127 @@
+import os
+import struct
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import Maze_Storage
+from Builder_Maze import Maze, Adjacency
+from Maze_Compact import CompactMaze, CompactMazeBuilder
+from Maze_DoorStates import DoorBytes
+from Maze_Generators import PrimGenerator
+from Maze_Paths import shortest_path
+
+# Appended after the maze sections: CSR rows + 1 and edge count, then offsets, neighbors and door ids
+_ADJACENCY_HEADER = struct.Struct("<II")
+# Sections every attached process may read but never write
+_READ_ONLY = ("room_kinds", "room_spells", "sides", "door_rooms", "door_kinds", "door_spells")
+
+
+class SharedMaze:
+    # Owner of a published maze: keeps the shared memory block alive until close() / unlink()
+    def __init__(self, maze, name=None):
+        if isinstance(maze, Maze):
+            maze = CompactMaze.from_maze(maze)
+        graph = maze.adjacency()
+        start = Maze_Storage.packed_size(maze)
+        size = start + _ADJACENCY_HEADER.size + 4 * (len(graph.offsets) + 2 * len(graph.neighbors))
+        self._memory = SharedMemory(name=name, create=True, size=size)
+        buffer = self._memory.buf
+        Maze_Storage.pack_into(maze, buffer)
+        _ADJACENCY_HEADER.pack_into(buffer, start, len(graph.offsets), len(graph.neighbors))
+        offset = start + _ADJACENCY_HEADER.size
+        for data in (graph.offsets, graph.neighbors, graph.door_ids):
+            data = memoryview(data).cast('B')
+            buffer[offset:offset + len(data)] = data
+            offset += len(data)
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def close(self):
+        self._memory.close()
+
+    def unlink(self):
+        self._memory.close()
+        self._memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.unlink()
+
+
+def publish(maze, name=None):
+    return SharedMaze(maze, name)
+
+
+def _open(name):
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block with the resource tracker; processes
+        # started by the publisher share its tracker, so the block still lives until unlink()
+        return SharedMemory(name=name)
+
+
+def attach(name):
+    # Topology is read straight from the shared block and cannot be written; door and room state
+    # are copied into private arrays so each process keeps its own opened doors and exploded bombs
+    if sys.byteorder != "little":
+        raise ValueError("Shared mazes are stored little-endian and can only be attached on little-endian hosts.")
+    memory = _open(name)
+    buffer = memory.buf
+    maze = Maze_Storage.attach(buffer, name)
+    for section in _READ_ONLY:
+        setattr(maze, section, getattr(maze, section).toreadonly())
+    maze.room_state = bytearray(maze.room_state)
+    maze.door_open = DoorBytes(maze.door_open)
+    offset = Maze_Storage.stored_size(buffer, name)
+    rows, edges = _ADJACENCY_HEADER.unpack_from(buffer, offset)
+    offset += _ADJACENCY_HEADER.size
+    views = []
+    for length in (rows, edges, edges):
+        views.append(buffer[offset:offset + 4 * length].cast('i').toreadonly())
+        offset += 4 * length
+    offsets, neighbors, door_ids = views
+    room_numbers = array('i', range(maze.first_id, maze.first_id + rows - 1))
+    maze._adjacency = Adjacency(room_numbers, offsets, neighbors, door_ids, maze.door_open)
+    maze._shared_memory = memory
+    return maze
+
+
+_worker_maze = None
+
+
+def _attach_worker(name):
+    global _worker_maze
+    _worker_maze = attach(name)
+
+
+def _worker_query(query):
+    start, goal, opened = query
+    # Doors opened here are private to this worker and never reach the shared block
+    for door_id in opened:
+        _worker_maze.door_open[door_id] = 1
+    path = shortest_path(_worker_maze, start, goal, include_closed=not opened)
+    return os.getpid(), len(path) - 1 if path else None
+
+
+# Example usage
+if __name__ == "__main__":
+    width, height = 200, 200
+    maze = PrimGenerator(width, height, seed=11).generate(CompactMazeBuilder())
+    with publish(maze) as shared:
+        print(f"Published {maze.room_count} rooms and {maze.door_count} doors as '{shared.name}'")
+        queries = [(1, width * height, ()), (width, width * (height - 1) + 1, ()),
+                   (1, 2, tuple(range(maze.door_count)))]
+        with ProcessPoolExecutor(max_workers=2, initializer=_attach_worker, initargs=(shared.name,)) as pool:
+            for (start, goal, opened), (pid, length) in zip(queries, pool.map(_worker_query, queries)):
+                print(f"  worker {pid}: {start} -> {goal} takes {length} steps"
+                      f"{' with every door opened privately' if opened else ''}")
+        local = attach(shared.name)
+        print(f"Doors open in a fresh attachment: {sum(local.door_open)}")
+        del local
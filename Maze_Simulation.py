@@ -0,0 +1,286 @@
+import asyncio
+import random
+import sys
+from array import array
+from time import perf_counter
+
+from Maze_Compact import CompactMazeBuilder
+from Maze_DoorStates import door_state
+from Maze_Events import bus, EventType, RingBufferSink
+from Maze_Generators import PrimGenerator
+from Maze_Paths import adjacency_of
+
+
+class Simulation:
+    # Agents are rows of parallel arrays (current CSR row, goal row or -1 to wander), not objects.
+    # Each tick moves every agent once and reports the whole batch as a single AGENTS_MOVED event
+    # instead of calling enter() on rooms and doors per agent.
+    def __init__(self, maze, seed=None, include_closed=False):
+        self.maze = maze
+        self.graph = adjacency_of(maze)
+        self.rng = random.Random(seed)
+        self.include_closed = include_closed
+        self.tick = 0
+        self.agent_rows = array('i')
+        self.agent_goals = array('i')
+        self.occupancy = array('i', [0]) * len(self.graph)
+        self._routes = {}
+        self._routes_doors = None
+
+    def __len__(self):
+        return len(self.agent_rows)
+
+    def _current_graph(self):
+        # A maze that rebuilt its adjacency index has a new layout: agents keep their rooms and goals,
+        # moved over to the new rows, and every route is rebuilt
+        maze = self.maze
+        if not hasattr(maze, "adjacency") or maze.adjacency() is self.graph:
+            return self.graph
+        old_numbers, graph = self.graph.room_numbers, maze.adjacency()
+        row_of = graph.row
+        rows = array('i', [row_of(old_numbers[row]) for row in self.agent_rows])
+        if -1 in rows:
+            agent = rows.index(-1)
+            raise ValueError(f"Room {old_numbers[self.agent_rows[agent]]} of agent {agent} is no longer in the maze.")
+        self.agent_goals = array('i', [row_of(old_numbers[goal]) if goal >= 0 else -1 for goal in self.agent_goals])
+        self.agent_rows = rows
+        self.occupancy = array('i', [0]) * len(graph)
+        for row in rows:
+            self.occupancy[row] += 1
+        self.graph = graph
+        self._routes.clear()
+        self._routes_doors = None
+        return graph
+
+    def _row(self, room_number):
+        row = self._current_graph().row(room_number)
+        if row < 0 or self.maze.room_no(room_number) is None:
+            raise ValueError(f"Room {room_number} is not in the maze.")
+        return row
+
+    def spawn(self, room_number, count=1):
+        row = self._row(room_number)
+        first = len(self.agent_rows)
+        self.agent_rows.extend(array('i', [row]) * count)
+        self.agent_goals.extend(array('i', [-1]) * count)
+        self.occupancy[row] += count
+        return range(first, first + count)
+
+    def set_goal(self, agents, room_number=None):
+        goal = -1 if room_number is None else self._row(room_number)
+        for agent in agents:
+            self.agent_goals[agent] = goal
+
+    def room_of(self, agent):
+        return self._current_graph().room_numbers[self.agent_rows[agent]]
+
+    def occupants(self, room_number):
+        return self.occupancy[self._row(room_number)]
+
+    def set_door(self, door_id, is_open):
+        graph = self._current_graph()
+        if graph.doors is not None:
+            graph.doors[door_id].is_open = is_open
+        else:
+            graph.door_open[door_id] = is_open
+
+    def _door_version(self):
+        # DoorStates and CompactMaze's DoorBytes count their writes; any other door table is compared whole
+        door_open = self.graph.door_open
+        version = getattr(door_open, "version", None)
+        return version if version is not None else door_state(door_open)
+
+    def _route(self, goal):
+        # Edge to take from every row towards goal: one BFS per goal, shared by all agents heading there
+        route = self._routes.get(goal)
+        if route is None:
+            graph = self.graph
+            offsets, neighbors, door_ids, door_open = graph.offsets, graph.neighbors, graph.door_ids, graph.door_open
+            include_closed = self.include_closed
+            route = array('i', [-1]) * len(graph)
+            seen = bytearray(len(graph))
+            seen[goal] = 1
+            frontier = [goal]
+            while frontier:
+                next_frontier = []
+                for current in frontier:
+                    for edge in range(offsets[current], offsets[current + 1]):
+                        nxt = neighbors[edge]
+                        if not seen[nxt] and (include_closed or door_open[door_ids[edge]]):
+                            seen[nxt] = 1
+                            # Doors are two-way, so the reverse edge is the one leading back to current
+                            route[nxt] = next(back for back in range(offsets[nxt], offsets[nxt + 1])
+                                              if neighbors[back] == current and door_ids[back] == door_ids[edge])
+                            next_frontier.append(nxt)
+                frontier = next_frontier
+            self._routes[goal] = route
+        return route
+
+    def step(self):
+        graph = self._current_graph()
+        offsets, neighbors, door_ids, door_open = graph.offsets, graph.neighbors, graph.door_ids, graph.door_open
+        include_closed = self.include_closed
+        rows, goals, occupancy = self.agent_rows, self.agent_goals, self.occupancy
+        random_value = self.rng.random
+        if not include_closed:
+            # Routes follow the doors that were open when they were built, however the doors changed since
+            version = self._door_version()
+            if version != self._routes_doors:
+                self._routes.clear()
+                self._routes_doors = version
+        routes = {goal: self._route(goal) for goal in set(goals) if goal >= 0}
+        moved, rooms_from, rooms_to, blocked = array('i'), array('i'), array('i'), array('i')
+        for agent, row in enumerate(rows):
+            goal = goals[agent]
+            if goal < 0:
+                start = offsets[row]
+                degree = offsets[row + 1] - start
+                if not degree:
+                    continue
+                edge = start + int(random_value() * degree)
+            elif goal == row:
+                continue
+            else:
+                edge = routes[goal][row]
+                if edge < 0:
+                    continue
+            if include_closed or door_open[door_ids[edge]]:
+                nxt = neighbors[edge]
+                rows[agent] = nxt
+                occupancy[row] -= 1
+                occupancy[nxt] += 1
+                moved.append(agent)
+                rooms_from.append(row)
+                rooms_to.append(nxt)
+            else:
+                blocked.append(door_ids[edge])
+        self.tick += 1
+        if bus.enabled:
+            numbers = graph.room_numbers
+            bus.emit(EventType.AGENTS_MOVED, tick=self.tick, agents=moved.tolist(),
+                     rooms_from=[numbers[row] for row in rooms_from], rooms_to=[numbers[row] for row in rooms_to],
+                     blocked_doors=blocked.tolist())
+        return len(moved)
+
+    def run(self, ticks):
+        return sum(self.step() for _ in range(ticks))
+
+    def stats(self):
+        graph = self._current_graph()
+        busiest = max(range(len(self.occupancy)), key=self.occupancy.__getitem__) if len(self.occupancy) else -1
+        return {"tick": self.tick, "agents": len(self.agent_rows),
+                "busiest_room": graph.room_numbers[busiest] if busiest >= 0 else None,
+                "busiest_occupancy": self.occupancy[busiest] if busiest >= 0 else 0}
+
+
+class SimulationServer:
+    # asyncio front end: commands are queued and applied between ticks, so the tick loop never
+    # sees a half-applied command. Clients speak one text command per line, e.g. "spawn 1 500".
+    def __init__(self, simulation: Simulation, tick_interval=0.0):
+        self.simulation = simulation
+        self.tick_interval = tick_interval
+        self._queue = asyncio.Queue()
+        self._running = False
+        self._commands = {
+            "spawn": lambda room, count=1: list(simulation.spawn(room, count)),
+            "goal": lambda room, *agents: simulation.set_goal(agents, room),
+            "wander": lambda *agents: simulation.set_goal(agents),
+            "open": lambda door_id: simulation.set_door(door_id, True),
+            "close": lambda door_id: simulation.set_door(door_id, False),
+            "where": simulation.room_of,
+            "occupants": simulation.occupants,
+            "stats": simulation.stats,
+            "stop": self.stop,
+        }
+
+    async def submit(self, command, *args):
+        # Nothing would apply a command queued while the tick loop is not running
+        if not self._running:
+            raise ValueError("The simulation server is not running.")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((command, args, future))
+        return await future
+
+    def stop(self):
+        self._running = False
+
+    def _apply_pending(self):
+        while not self._queue.empty():
+            command, args, future = self._queue.get_nowait()
+            handler = self._commands.get(command)
+            try:
+                if handler is None:
+                    raise ValueError(f"Unknown command '{command}'.")
+                future.set_result(handler(*args))
+            except (ValueError, TypeError, IndexError) as error:
+                future.set_exception(error)
+
+    async def run(self, ticks=None):
+        self._running = True
+        while self._running and (ticks is None or ticks > 0):
+            self._apply_pending()
+            if not self._running:
+                break
+            self.simulation.step()
+            if ticks is not None:
+                ticks -= 1
+            await asyncio.sleep(self.tick_interval)
+        self._apply_pending()
+
+    async def handle_client(self, reader, writer):
+        while line := (await reader.readline()).decode().strip():
+            command, *args = line.split()
+            try:
+                result = await self.submit(command, *map(int, args))
+            except (ValueError, TypeError, IndexError) as error:
+                result = f"error: {error}"
+            writer.write(f"{result}\n".encode())
+            await writer.drain()
+        writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self.handle_client, host, port)
+
+
+def _open_maze(width, height, seed=3):
+    maze = PrimGenerator(width, height, seed).generate(CompactMazeBuilder())
+    maze.door_open[:] = b"\x01" * len(maze.door_open)
+    return maze
+
+
+def benchmark(width=300, height=300, agents=100_000, ticks=10):
+    simulation = Simulation(_open_maze(width, height), seed=1)
+    simulation.spawn(1, agents // 2)
+    heading = simulation.spawn(width * height, agents - agents // 2)
+    simulation.set_goal(heading, 1)
+    simulation.step()
+    began = perf_counter()
+    moves = simulation.run(ticks)
+    elapsed = perf_counter() - began
+    print(f"{agents} agents on a {width}x{height} maze, {ticks} ticks: {moves} moves in {elapsed:.2f} s "
+          f"({moves / elapsed:,.0f} moves/s)")
+
+
+async def _demo():
+    simulation = Simulation(_open_maze(8, 8), seed=2)
+    server = SimulationServer(simulation)
+    runner = asyncio.create_task(server.run())
+    await asyncio.sleep(0)
+    wanderers = await server.submit("spawn", 1, 20)
+    seekers = await server.submit("spawn", 64, 5)
+    await server.submit("goal", 1, *seekers)
+    await asyncio.sleep(0.01)
+    print(f"After {simulation.tick} ticks: {await server.submit('stats')}")
+    print(f"Agent {wanderers[0]} is in room {await server.submit('where', wanderers[0])}, "
+          f"{await server.submit('occupants', 1)} agents are in room 1")
+    await server.submit("stop")
+    await runner
+
+
+# Example usage
+if __name__ == "__main__":
+    with bus.capture(RingBufferSink(capacity=5)) as sink:
+        asyncio.run(_demo())
+        print(f"Last batch event: tick {sink.events[-1].fields['tick']}, "
+              f"{len(sink.events[-1].fields['agents'])} agents moved")
+    benchmark(*map(int, sys.argv[1:5]))
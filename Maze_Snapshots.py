@@ -0,0 +1,286 @@
+import sys
+import tracemalloc
+from array import array
+from copy import deepcopy
+from itertools import chain
+from time import perf_counter
+
+from Builder_Maze import Direction
+from Maze_Compact import CompactMaze, CompactMazeBuilder, ROOM_BOMBED, STATE_BOMB_EXPLODED
+from Maze_DoorStates import DoorBytes
+from Maze_Generators import BacktrackerGenerator
+
+CHUNK_BITS = 10
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+PAGE_BITS = 5
+PAGE_MASK = (1 << PAGE_BITS) - 1
+PAGE_SHIFT = CHUNK_BITS + PAGE_BITS
+
+# The CompactMaze arrays a VersionedMaze keeps as PersistentArrays
+_FIELDS = (("room_kinds", 'B'), ("room_spells", 'i'), ("room_state", 'B'), ("sides", 'i'),
+           ("door_rooms", 'i'), ("door_kinds", 'B'), ("door_spells", 'i'), ("door_open", 'B'))
+
+
+class _Page(list):
+    # Pages and the root are lists tagged with the token of the version allowed to write them in place
+    __slots__ = ("owner",)
+
+
+class _Chunk(array):
+    __slots__ = ("owner",)
+
+
+class PersistentArray:
+    # Typed array kept as a two-level tree (a root list of pages, each page a list of fixed-size
+    # chunks) that copies share. copy() is O(1); afterwards a copy duplicates a chunk, the page above
+    # it and the root the first time it writes there, so the memory of a version grows with the
+    # chunks it changed rather than with its length.
+    def __init__(self, typecode, values=()):
+        self.typecode = typecode
+        self._token = object()
+        self._pages = self._new(_Page())
+        self._length = 0
+        self.extend(values)
+
+    def copy(self):
+        other = object.__new__(PersistentArray)
+        other.typecode, other._pages, other._length = self.typecode, self._pages, self._length
+        # Fresh tokens on both sides: every existing page and chunk is now shared and neither may
+        # write to it in place any more. A token lives as long as anything tagged with it, so unlike
+        # an id() it cannot be handed to another version while shared items still carry it.
+        other._token, self._token = object(), object()
+        return other
+
+    def __len__(self):
+        return self._length
+
+    def _new(self, item):
+        item.owner = self._token
+        return item
+
+    def _chunks(self):
+        return chain.from_iterable(self._pages)
+
+    def __iter__(self):
+        return chain.from_iterable(self._chunks())
+
+    def __eq__(self, other):
+        return self.toarray() == (other.toarray() if isinstance(other, PersistentArray) else other)
+
+    def _index(self, index):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("PersistentArray index out of range")
+        return index
+
+    def _chunk(self, number):
+        return self._pages[number >> PAGE_BITS][number & PAGE_MASK]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            # Only the chunks the slice covers are copied out
+            positions = range(*index.indices(self._length))
+            if not positions:
+                return array(self.typecode)
+            low, high = sorted((positions[0], positions[-1]))
+            base = low & ~CHUNK_MASK
+            part = array(self.typecode)
+            for number in range(low >> CHUNK_BITS, (high >> CHUNK_BITS) + 1):
+                part.extend(self._chunk(number))
+            if positions.step == 1:
+                return part[low - base:high + 1 - base]
+            return array(self.typecode, [part[position - base] for position in positions])
+        index = self._index(index)
+        return self._chunk(index >> CHUNK_BITS)[index & CHUNK_MASK]
+
+    def _own(self, container, slot, make):
+        item = container[slot]
+        if item.owner is not self._token:
+            item = container[slot] = self._new(make(item))
+        return item
+
+    def _root(self):
+        if self._pages.owner is not self._token:
+            self._pages = self._new(_Page(self._pages))
+        return self._pages
+
+    def _writable(self, number):
+        page = self._own(self._root(), number >> PAGE_BITS, _Page)
+        return self._own(page, number & PAGE_MASK, lambda chunk: _Chunk(self.typecode, chunk))
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            values = array(self.typecode, value)
+            if step != 1 or len(values) != max(stop - start, 0):
+                raise ValueError("PersistentArray slices can only be overwritten with the same number of items.")
+            position = start
+            while position < stop:
+                end = min(stop, (position | CHUNK_MASK) + 1)
+                self._writable(position >> CHUNK_BITS)[position & CHUNK_MASK:((end - 1) & CHUNK_MASK) + 1] = \
+                    values[position - start:end - start]
+                position = end
+            return
+        index = self._index(index)
+        self._writable(index >> CHUNK_BITS)[index & CHUNK_MASK] = value
+
+    def append(self, value):
+        self.extend((value,))
+
+    def extend(self, values):
+        if not (isinstance(values, array) and values.typecode == self.typecode):
+            values = array(self.typecode, values)
+        taken = min(-self._length & CHUNK_MASK, len(values))
+        if taken:
+            self._writable((self._length - 1) >> CHUNK_BITS).extend(values[:taken])
+        for start in range(taken, len(values), CHUNK_SIZE):
+            chunk = self._new(_Chunk(self.typecode, values[start:start + CHUNK_SIZE]))
+            number = (self._length + start) >> CHUNK_BITS
+            root = self._root()
+            if number & PAGE_MASK:
+                page = self._own(root, len(root) - 1, _Page)
+            else:
+                page = self._new(_Page())
+                root.append(page)
+            page.append(chunk)
+        self._length += len(values)
+
+    def frombytes(self, data):
+        values = array(self.typecode)
+        values.frombytes(data)
+        self.extend(values)
+
+    def count(self, value):
+        return sum(chunk.count(value) for chunk in self._chunks())
+
+    def toarray(self):
+        values = array(self.typecode)
+        for chunk in self._chunks():
+            values.extend(chunk)
+        return values
+
+    def tobytes(self):
+        return b"".join(chunk.tobytes() for chunk in self._chunks())
+
+    def chunk_count(self):
+        return -(-self._length // CHUNK_SIZE)
+
+    def shared_chunks(self, other):
+        other_ids = {id(chunk) for chunk in other._chunks()}
+        return sum(1 for chunk in self._chunks() if id(chunk) in other_ids)
+
+
+class VersionedMaze(CompactMaze):
+    # A CompactMaze whose arrays are PersistentArrays. snapshot() hands out an independent version in
+    # O(1) time; the two share every chunk until one of them writes to it, so old versions stay
+    # readable for rollback and a what-if branch costs only the chunks it touches.
+    def __init__(self, first_id=1):
+        super().__init__(first_id)
+        for name, typecode in _FIELDS:
+            setattr(self, name, PersistentArray(typecode, getattr(self, name)))
+        self.version = 0
+        self._spells_shared = False
+
+    @classmethod
+    def from_compact(cls, compact: CompactMaze):
+        maze = cls(compact.first_id)
+        for name, typecode in _FIELDS:
+            setattr(maze, name, PersistentArray(typecode, getattr(compact, name)))
+        maze.grid, maze.room_count = compact.grid, compact.room_count
+        for spell in compact.spells:
+            maze.intern_spell(spell)
+        maze._components = None
+        return maze
+
+    def to_compact(self):
+        compact = CompactMaze(self.first_id)
+        for name, _ in _FIELDS:
+            setattr(compact, name, getattr(self, name).toarray())
+        compact.room_state, compact.door_open = bytearray(compact.room_state), DoorBytes(compact.door_open)
+        compact.grid, compact.room_count = self.grid, self.room_count
+        for spell in self.spells:
+            compact.intern_spell(spell)
+        compact._components = None
+        return compact
+
+    def snapshot(self):
+        other = object.__new__(type(self))
+        other.__dict__.update(self.__dict__)
+        for name, _ in _FIELDS:
+            setattr(other, name, getattr(self, name).copy())
+        # The adjacency index stays with self (it reads self.door_open); the connectivity index is
+        # rebuilt by the snapshot only if it is asked for
+        other._adjacency, other.landmarks, other._components = None, None, None
+        self._spells_shared = other._spells_shared = True
+        self.version += 1
+        return other
+
+    clone = snapshot
+
+    def intern_spell(self, spell):
+        if self._spells_shared and spell is not None and spell not in self._spell_ids:
+            self.spells, self._spell_ids = list(self.spells), dict(self._spell_ids)
+            self._spells_shared = False
+        return super().intern_spell(spell)
+
+    def chunks_shared_with(self, other):
+        return sum(getattr(self, name).shared_chunks(getattr(other, name)) for name, _ in _FIELDS)
+
+    def chunk_count(self):
+        return sum(getattr(self, name).chunk_count() for name, _ in _FIELDS)
+
+
+def _branch(maze, versions):
+    # A snapshot before every step, each step exploding one bomb and opening one door
+    kept = []
+    rooms = len(maze.room_kinds)
+    for version in range(versions):
+        kept.append(maze.snapshot())
+        maze.room_no(maze.first_id + version * 7919 % rooms).bomb_exploded = True
+        maze.door_open[version * 104729 % maze.door_count] = 1
+    return kept
+
+
+def benchmark(width=1000, height=1000, versions=1000):
+    compact = BacktrackerGenerator(width, height, seed=2).generate(CompactMazeBuilder(ROOM_BOMBED))
+    began = perf_counter()
+    copy = deepcopy(compact)
+    deep = perf_counter() - began
+    del copy
+    maze = VersionedMaze.from_compact(compact)
+    began = perf_counter()
+    kept = _branch(maze, versions)
+    elapsed = perf_counter() - began
+    del kept
+    maze = VersionedMaze.from_compact(compact)
+    tracemalloc.start()
+    kept = _branch(maze, versions)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{width}x{height} maze: deepcopy {deep * 1000:.0f} ms per copy; {versions} snapshot steps in "
+          f"{elapsed * 1000:.0f} ms ({elapsed / versions * 1e6:.0f} us each) holding {current / 2 ** 20:.1f} MiB in all; "
+          f"the first version still shares {kept[0].chunks_shared_with(maze)} of {maze.chunk_count()} chunks")
+
+
+# Example usage
+if __name__ == "__main__":
+    from Prototype_Maze import MazePrototypeFactory, Wall, Room, Door
+
+    maze = VersionedMaze.from_compact(BacktrackerGenerator(4, 4, seed=1).generate(CompactMazeBuilder(ROOM_BOMBED)))
+    before = maze.snapshot()
+    maze.room_no(1).explode_bomb()
+    maze.room_no(6).damage_wall(Direction.North)
+    print(f"Room 1 bomb exploded: now {maze.room_no(1).bomb_exploded}, in the snapshot {before.room_no(1).bomb_exploded}")
+    what_if = maze.snapshot()
+    what_if.room_state[5] |= STATE_BOMB_EXPLODED
+    print(f"What-if branch changed room 6 only there: {what_if.room_no(6).bomb_exploded} vs "
+          f"{maze.room_no(6).bomb_exploded}; rolled back to version {before.version}: "
+          f"{before.to_compact().room_state == bytearray(16)}")
+    # A VersionedMaze serves as the maze prototype of Prototype_Maze: make_maze() is a snapshot, not a deepcopy
+    factory = MazePrototypeFactory(maze, Wall(), Room(1), Door())
+    made = factory.make_maze()
+    print(f"Maze made from the prototype shares {made.chunks_shared_with(maze)} of {maze.chunk_count()} chunks")
+    print()
+    benchmark(*map(int, sys.argv[1:4]))
@@ -0,0 +1,201 @@
+import random
+import sys
+from time import perf_counter
+
+from Builder_Maze import Direction, DoorNeedingSpell, EnchantedRoom, EnchantedMazeBuilder
+from Maze_Compact import CompactMaze, CompactMazeBuilder, ROOM_PLAIN, ROOM_ENCHANTED, DOOR_SPELL
+from Maze_Paths import adjacency_of, _rows, _open_grid_maze
+
+
+class SpellBits:
+    # Interns spells to bit positions so a set of held spells is a single int. CompactMaze spell
+    # ids are already dense, so they are taken over in order and spell id n is bit n.
+    def __init__(self, spells=()):
+        self.spells = []
+        self._bits = {}
+        for spell in spells:
+            self.bit(spell)
+
+    def bit(self, spell):
+        if spell is None:
+            return 0
+        index = self._bits.get(spell)
+        if index is None:
+            index = self._bits[spell] = len(self.spells)
+            self.spells.append(spell)
+        return 1 << index
+
+    def mask(self, spells):
+        mask = 0
+        for spell in spells:
+            mask |= self.bit(spell)
+        return mask
+
+    def names(self, mask):
+        return [spell for index, spell in enumerate(self.spells) if mask >> index & 1]
+
+
+def _spell_tables(maze, graph):
+    # needs: spell mask each door id asks for (0 for plain doors); pickups: mask each row hands out on entry
+    if isinstance(maze, CompactMaze):
+        bits = SpellBits(maze.spells)
+        needs = [1 << spell if kind == DOOR_SPELL and spell >= 0 else 0
+                 for kind, spell in zip(maze.door_kinds, maze.door_spells)]
+        pickups = [1 << spell if kind == ROOM_ENCHANTED and spell >= 0 else 0
+                   for kind, spell in zip(maze.room_kinds, maze.room_spells)]
+        return bits, needs, pickups
+    bits = SpellBits()
+    needs = [bits.bit(door.spell) if isinstance(door, DoorNeedingSpell) else 0 for door in graph.doors]
+    rooms = maze.rooms
+    pickups = [bits.bit(room.spell) if isinstance(room, EnchantedRoom) else 0
+               for room in map(rooms.get, graph.room_numbers)]
+    return bits, needs, pickups
+
+
+def reachable_rooms(maze, start, spells=(), include_closed=False):
+    # Every room a player starting in `start` with `spells` can get to. Spells are never lost, so this
+    # needs no spell states: one flood fill that parks doors it cannot open yet and lets them through
+    # once a pickup brings their spell.
+    graph = adjacency_of(maze)
+    source, = _rows(maze, graph, start)
+    bits, needs, pickups = _spell_tables(maze, graph)
+    offsets, neighbors, door_ids, door_open = graph.offsets, graph.neighbors, graph.door_ids, graph.door_open
+    mask = bits.mask(spells) | pickups[source]
+    reached = bytearray(len(graph))
+    reached[source] = 1
+    locked = []
+    stack = [source]
+    while stack:
+        current = stack.pop()
+        for edge in range(offsets[current], offsets[current + 1]):
+            nxt = neighbors[edge]
+            if reached[nxt]:
+                continue
+            door_id = door_ids[edge]
+            need = needs[door_id]
+            if need:
+                if need & mask != need:
+                    locked.append((need, nxt))
+                    continue
+            elif not (include_closed or door_open[door_id]):
+                continue
+            reached[nxt] = 1
+            stack.append(nxt)
+            if pickups[nxt] & ~mask:
+                mask |= pickups[nxt]
+                still_locked = []
+                for need, row in locked:
+                    if need & mask != need:
+                        still_locked.append((need, row))
+                    elif not reached[row]:
+                        reached[row] = 1
+                        stack.append(row)
+                locked = still_locked
+    room_numbers = graph.room_numbers
+    return [room_numbers[row] for row, flag in enumerate(reached) if flag]
+
+
+def spell_path(maze, start, goal, spells=(), include_closed=False):
+    # Fewest-doors room path from start to goal, revisiting rooms where a detour for a spell pays off.
+    # Returns (path, spells held on arrival) or None when no order of pickups gets there.
+    # The search is a BFS over (row, held spells) states packed as (mask << row_bits) | row. A state is
+    # dropped when its row was already reached holding a superset of its spells: BFS order means the
+    # earlier state is no further from the start and can go everywhere this one can.
+    graph = adjacency_of(maze)
+    source, target = _rows(maze, graph, start, goal)
+    bits, needs, pickups = _spell_tables(maze, graph)
+    offsets, neighbors, door_ids, door_open = graph.offsets, graph.neighbors, graph.door_ids, graph.door_open
+    row_bits = max(len(graph), 1).bit_length()
+    row_mask = (1 << row_bits) - 1
+    held = [None] * len(graph)
+    mask = bits.mask(spells) | pickups[source]
+    state = mask << row_bits | source
+    held[source] = [mask]
+    parents = {state: state}
+    queue = [state]
+    head = 0
+    while head < len(queue):
+        state = queue[head]
+        head += 1
+        current, mask = state & row_mask, state >> row_bits
+        if current == target:
+            break
+        for edge in range(offsets[current], offsets[current + 1]):
+            door_id = door_ids[edge]
+            need = needs[door_id]
+            # A spell door opens for whoever holds its spell; plain doors follow include_closed
+            if need:
+                if need & mask != need:
+                    continue
+            elif not (include_closed or door_open[door_id]):
+                continue
+            nxt = neighbors[edge]
+            next_mask = mask | pickups[nxt]
+            seen = held[nxt]
+            if seen is None:
+                held[nxt] = [next_mask]
+            elif any(other & next_mask == next_mask for other in seen):
+                continue
+            else:
+                seen.append(next_mask)
+            next_state = next_mask << row_bits | nxt
+            parents[next_state] = state
+            queue.append(next_state)
+    else:
+        return None
+    room_numbers = graph.room_numbers
+    path = [room_numbers[current]]
+    while parents[state] != state:
+        state = parents[state]
+        path.append(room_numbers[state & row_mask])
+    return path[::-1], bits.names(mask)
+
+
+def benchmark(width=300, height=300, spells=4, seed=4):
+    # An open grid rather than a generated maze: with loops there are ways around a locked door, so
+    # the search has to weigh detours for spells against going round
+    maze = _open_grid_maze(CompactMazeBuilder(width=width, height=height), width, height)
+    rng = random.Random(seed)
+    names = [f"spell {index}" for index in range(spells)]
+    # A tenth of the doors need a spell, and each spell can be picked up in one room
+    for door_id in rng.sample(range(maze.door_count), maze.door_count // 10):
+        maze.door_kinds[door_id] = DOOR_SPELL
+        maze.door_spells[door_id] = maze.intern_spell(rng.choice(names))
+    for name, room_number in zip(names, rng.sample(range(2, width * height + 1), spells)):
+        row = room_number - maze.first_id
+        maze.room_kinds[row] = ROOM_ENCHANTED
+        maze.room_spells[row] = maze.intern_spell(name)
+    began = perf_counter()
+    reachable = reachable_rooms(maze, 1, include_closed=True)
+    searched = perf_counter() - began
+    began = perf_counter()
+    found = spell_path(maze, 1, width * height, include_closed=True)
+    elapsed = perf_counter() - began
+    length = len(found[0]) - 1 if found else None
+    print(f"{width}x{height} maze, {spells} spells: {len(reachable)} rooms reachable in {searched:.2f} s, "
+          f"corner to corner {length} doors in {elapsed:.2f} s")
+
+
+# Example usage
+if __name__ == "__main__":
+    # 1 2 3    The ice door 2-3 hides the goal, the ice is behind the fire door 4-5 and the fire is in room 2
+    # 4 5 6
+    maze = CompactMaze()
+    pickups = {2: "fire", 6: "ice"}
+    for room_number in range(1, 7):
+        maze.add_room(room_number, ROOM_ENCHANTED if room_number in pickups else ROOM_PLAIN, pickups.get(room_number))
+    maze.add_door(1, 2, Direction.East, Direction.West)
+    maze.add_door(2, 3, Direction.East, Direction.West, DOOR_SPELL, "ice")
+    maze.add_door(1, 4, Direction.South, Direction.North)
+    maze.add_door(4, 5, Direction.East, Direction.West, DOOR_SPELL, "fire")
+    maze.add_door(5, 6, Direction.East, Direction.West)
+    print("Reachable from 1 with no spells:", reachable_rooms(maze, 1, include_closed=True))
+    print("Path 1 -> 3 collecting spells:", spell_path(maze, 1, 3, include_closed=True))
+    print("Path 1 -> 3 already holding ice:", spell_path(maze, 1, 3, ["ice"], include_closed=True))
+    builder = EnchantedMazeBuilder(2, 2)
+    builder.build_maze()
+    builder.build_rooms(range(1, 5))
+    builder.build_doors([(1, 2), (2, 4), (3, 4)])
+    print("Enchanted builder maze path 1 -> 3:", spell_path(builder.get_maze(), 1, 3))
+    print()
+    benchmark(*map(int, sys.argv[1:4]))
@@ -0,0 +1,238 @@
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from time import perf_counter
+
+from Builder_Maze import Maze, Direction
+from Maze_Compact import CompactMaze, CompactMazeBuilder, ROOM_BOMBED
+from Maze_DoorStates import DoorBytes
+from Maze_Grid import GridTopology
+
+MAGIC = b"MAZE"
+VERSION = 2
+# Version 1 files have no door_spells section; they still load, with no spell on any door
+READABLE_VERSIONS = (1, 2)
+# magic, version, flags, first_id, rows, room_count, door_count, spell_count, spell bytes,
+# grid width, grid height, grid first id (a zero grid width means the maze has no grid)
+HEADER = struct.Struct("<4sHHiIIIIIIIi")
+_ALIGNMENT = 8
+
+
+def _align(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def _layout(header):
+    # (name, typecode, length) of every section, in file order, each starting on an 8-byte boundary
+    version, rows, doors, spells, spell_bytes = header[1], header[4], header[6], header[7], header[8]
+    sections = [
+        ("room_kinds", 'B', rows),
+        ("room_spells", 'i', rows),
+        ("room_state", 'B', rows),
+        ("sides", 'i', 4 * rows),
+        ("door_rooms", 'i', 2 * doors),
+        ("door_kinds", 'B', doors),
+        ("door_spells", 'i', doors if version >= 2 else 0),
+        ("door_open", 'B', doors),
+        ("spell_offsets", 'I', spells + 1),
+        ("spell_data", 'B', spell_bytes),
+    ]
+    offset = _align(HEADER.size)
+    layout = {}
+    for name, typecode, length in sections:
+        layout[name] = (offset, typecode, length)
+        offset = _align(offset + length * struct.calcsize(typecode))
+    return layout, offset
+
+
+def _write_section(file, data, typecode):
+    if sys.byteorder != "little" and typecode != 'B':
+        data = array(typecode, data)
+        data.byteswap()
+    file.write(memoryview(data).cast('B'))
+    file.write(bytes(_align(file.tell()) - file.tell()))
+
+
+class SpellPool:
+    # Spell strings decoded from the mapped pool one at a time, on demand
+    def __init__(self, offsets, data):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, spell_id):
+        if not 0 <= spell_id < len(self):
+            raise IndexError(spell_id)
+        return bytes(self._data[self._offsets[spell_id]:self._offsets[spell_id + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[spell_id] for spell_id in range(len(self)))
+
+
+def _prepare(maze):
+    # Header fields and the (data, typecode) of every section, in file order
+    if isinstance(maze, Maze):
+        maze = CompactMaze.from_maze(maze)
+    encoded = [str(spell).encode("utf-8") for spell in maze.spells]
+    spell_offsets = array('I', [0])
+    for spell in encoded:
+        spell_offsets.append(spell_offsets[-1] + len(spell))
+    grid = maze.grid
+    header = (MAGIC, VERSION, 0, maze.first_id, len(maze.room_kinds), maze.room_count, maze.door_count,
+              len(encoded), spell_offsets[-1], grid.width if grid else 0, grid.height if grid else 0,
+              grid.first_id if grid else 0)
+    sections = [(maze.room_kinds, 'B'), (maze.room_spells, 'i'), (maze.room_state, 'B'), (maze.sides, 'i'),
+                (maze.door_rooms, 'i'), (maze.door_kinds, 'B'), (maze.door_spells, 'i'), (maze.door_open, 'B'),
+                (spell_offsets, 'I'), (b"".join(encoded), 'B')]
+    return header, sections
+
+
+def packed_size(maze):
+    header, _ = _prepare(maze)
+    return _layout(header)[1]
+
+
+def save(maze, path):
+    # Builder_Maze.Maze objects are converted first; a CompactMaze is written straight from its arrays
+    header, sections = _prepare(maze)
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(*header))
+        file.write(bytes(_align(file.tell()) - file.tell()))
+        for data, typecode in sections:
+            _write_section(file, data, typecode)
+
+
+def pack_into(maze, buffer):
+    # Same layout as save(), copied into a writable buffer such as a shared memory block
+    header, sections = _prepare(maze)
+    layout, size = _layout(header)
+    if len(buffer) < size:
+        raise ValueError(f"The buffer holds {len(buffer)} bytes, the maze needs {size}.")
+    HEADER.pack_into(buffer, 0, *header)
+    view = memoryview(buffer)
+    for (offset, _, _), (data, typecode) in zip(layout.values(), sections):
+        if sys.byteorder != "little" and typecode != 'B':
+            data = array(typecode, data)
+            data.byteswap()
+        data = memoryview(data).cast('B')
+        view[offset:offset + len(data)] = data
+    return size
+
+
+def read_header(buffer, path="<buffer>"):
+    if len(buffer) < HEADER.size:
+        raise ValueError(f"{path} is too short to be a maze file.")
+    header = HEADER.unpack_from(buffer)
+    if header[0] != MAGIC:
+        raise ValueError(f"{path} is not a maze file.")
+    if header[1] not in READABLE_VERSIONS:
+        raise ValueError(f"{path} is maze format version {header[1]}, expected one of {READABLE_VERSIONS}.")
+    return header
+
+
+def stored_size(buffer, path="<buffer>"):
+    # Bytes taken by the maze at the start of buffer, always a multiple of the section alignment
+    return _layout(read_header(buffer, path))[1]
+
+
+def attach(buffer, path="<buffer>"):
+    # Builds a CompactMaze whose arrays are memoryviews into buffer; nothing is parsed or copied
+    header = read_header(buffer, path)
+    _, version, _, first_id, rows, room_count, doors, _, _, width, height, grid_first = header
+    layout, size = _layout(header)
+    if len(buffer) < size:
+        raise ValueError(f"{path} is truncated: expected {size} bytes, found {len(buffer)}.")
+    view = memoryview(buffer)
+    sections = {name: view[offset:offset + length * struct.calcsize(typecode)].cast(typecode)
+                for name, (offset, typecode, length) in layout.items()}
+    maze = CompactMaze(first_id)
+    maze.grid = GridTopology(width, height, grid_first) if width else None
+    maze.room_count = room_count
+    for name in ("room_kinds", "room_spells", "room_state", "sides", "door_rooms", "door_kinds", "door_spells",
+                 "door_open"):
+        setattr(maze, name, sections[name])
+    if version < 2:
+        maze.door_spells = array('i', [-1]) * doors
+    maze.spells = SpellPool(sections["spell_offsets"], sections["spell_data"])
+    maze._components = None
+    return maze
+
+
+def load(path, copy=False):
+    # The default maps the file copy-on-write: pages are read on first touch, and opened doors,
+    # exploded bombs or damaged walls stay private to this process instead of reaching the file.
+    # Mapped mazes cannot grow; copy=True reads everything into ordinary arrays instead.
+    if copy or sys.byteorder != "little":
+        with open(path, "rb") as file:
+            mapped = attach(file.read(), path)
+        return _thaw(mapped)
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    maze = attach(buffer, path)
+    maze._buffer = buffer
+    return maze
+
+
+def _thaw(mapped):
+    maze = CompactMaze(mapped.first_id)
+    maze.grid = mapped.grid
+    maze.room_count = mapped.room_count
+    for name in ("room_kinds", "room_spells", "sides", "door_rooms", "door_kinds", "door_spells"):
+        data = array(getattr(mapped, name).format, getattr(mapped, name))
+        if sys.byteorder != "little" and data.itemsize > 1:
+            data.byteswap()
+        setattr(maze, name, data)
+    maze.room_state = bytearray(mapped.room_state)
+    maze.door_open = DoorBytes(mapped.door_open)
+    for spell in mapped.spells:
+        maze.intern_spell(spell)
+    maze._components = None
+    return maze
+
+
+def benchmark(width=1000, height=1000):
+    builder = CompactMazeBuilder(ROOM_BOMBED, width, height)
+    builder.build_maze()
+    builder.build_rooms(range(1, width * height + 1))
+    builder.build_doors([(room, room + 1) for room in range(1, width * height + 1) if room % width])
+    maze = builder.get_maze()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "grid.maze")
+        began = perf_counter()
+        save(maze, path)
+        saved = perf_counter() - began
+        began = perf_counter()
+        mapped = load(path)
+        opened = perf_counter() - began
+        began = perf_counter()
+        probes = [mapped.room_no(room).get_side(Direction.East) for room in range(1, width * height + 1, 997)]
+        probed = perf_counter() - began
+        print(f"{width}x{height} rooms, {os.path.getsize(path) / 2 ** 20:.1f} MB on disk: save {saved:.3f} s, "
+              f"mmap load {opened * 1000:.2f} ms, {len(probes)} room_no/get_side probes {probed * 1000:.2f} ms")
+        del mapped, probes
+
+
+# Example usage
+if __name__ == "__main__":
+    builder = CompactMazeBuilder(width=3, height=2)
+    builder.build_maze()
+    builder.build_rooms(range(1, 7))
+    builder.build_doors([(1, 2), (2, 3), (3, 6)])
+    maze = builder.get_maze()
+    maze.door_open[0] = 1
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "small.maze")
+        save(maze, path)
+        mapped = load(path)
+        print(f"Mapped maze: {mapped.room_count} rooms, {mapped.door_count} doors, grid {mapped.grid}")
+        print(f"Room 2 east side: {mapped.room_no(2).get_side(Direction.East)}, "
+              f"door 1-2 open: {mapped.room_no(1).get_side(Direction.East).is_open}")
+        print(f"Rooms 1 and 6 connected: {mapped.connected(1, 6)}, components: {mapped.component_count()}")
+        del mapped
+    print()
+    benchmark(*map(int, sys.argv[1:3]))
@@ -1,25 +1,153 @@
+import sys
+from collections import namedtuple
 from copy import deepcopy
+from time import perf_counter
+
+# How a prototype class is cloned: shallow fields are shared with the prototype, deep fields are
+# deep-copied and reset fields are set to a fixed (immutable) value instead of being copied
+CloneSpec = namedtuple("CloneSpec", ["shallow", "deep", "reset"], defaults=((), (), {}))
+
+_cloners = {}
+_resetters = {}
+
+
+def _spec_fields(cls, spec):
+    fields = (*spec.shallow, *spec.deep, *spec.reset)
+    for field in fields:
+        if not field.isidentifier():
+            raise ValueError(f"{cls.__name__}.clone_spec names '{field}', which is not an attribute name.")
+    return fields
+
+
+def _spec_cloner(cls, spec):
+    # A clone starts from a copy of the prototype's field dict, then deep-copies and resets the fields
+    # that ask for it. A prototype whose attributes are not exactly the spec's fields is deep-copied.
+    fields = frozenset(_spec_fields(cls, spec))
+    count = len(fields)
+    deep, reset = spec.deep, dict(spec.reset)
+    new = object.__new__
+
+    def clone(self):
+        state = self.__dict__
+        if len(state) != count or not fields.issuperset(state):
+            return deepcopy(self)
+        copy = new(cls)
+        copy.__dict__ = state.copy()
+        return copy
+
+    def clone_and_fix(self):
+        state = self.__dict__
+        if len(state) != count or not fields.issuperset(state):
+            return deepcopy(self)
+        copy = new(cls)
+        copy.__dict__ = values = state.copy()
+        for field in deep:
+            values[field] = deepcopy(state[field])
+        values.update(reset)
+        return copy
+    return clone_and_fix if deep or reset else clone
+
+
+def _spec_resetter(cls, spec):
+    # Rewrites a batch of used parts in place so each matches a fresh clone of the prototype
+    fields = frozenset(_spec_fields(cls, spec))
+    deep, reset = spec.deep, dict(spec.reset)
+
+    def reset_parts(parts, prototype):
+        if prototype.__dict__.keys() != fields:
+            # Cloned by deepcopy (see _spec_cloner), so the parts take over a fresh clone's fields too
+            return _reset_by_clone(parts, prototype)
+        template = {**prototype.__dict__, **reset}
+        for part in parts:
+            values = part.__dict__
+            if values.keys() != fields:
+                values.clear()
+            values.update(template)
+            for field in deep:
+                values[field] = deepcopy(prototype.__dict__[field])
+    return reset_parts
+
+
+def _own_spec(cls):
+    # Only a spec the class declares itself counts: a subclass may add fields its parent's spec does not name
+    return cls.__dict__.get("clone_spec")
+
+
+def _cloner_for(cls):
+    spec = _own_spec(cls)
+    if spec is not None:
+        return _spec_cloner(cls, spec)
+    # Prototypes from elsewhere keep their own clone(). A clone() inherited from a class with a spec
+    # would come back here, so subclasses of those and anything else fall back to deepcopy.
+    for klass in cls.__mro__:
+        if "clone_spec" in klass.__dict__:
+            break
+        if "clone" in klass.__dict__:
+            return klass.clone
+    return deepcopy
+
+
+def clone_prototype(prototype):
+    cloner = _cloners.get(type(prototype))
+    if cloner is None:
+        cloner = _cloners[type(prototype)] = _cloner_for(type(prototype))
+    return cloner(prototype)
+
+
+def _reset_by_hook(parts, prototype):
+    for part in parts:
+        part.reset(prototype)
+
+
+def _reset_by_clone(parts, prototype):
+    for part in parts:
+        part.__dict__ = clone_prototype(prototype).__dict__
+
+
+def _resetter_for(cls):
+    spec = _own_spec(cls)
+    if spec is not None:
+        return _spec_resetter(cls, spec)
+    # A class may bring its own reset(prototype) hook; otherwise a part takes over a fresh clone's fields
+    return _reset_by_hook if hasattr(cls, "reset") else _reset_by_clone
+
+
+def reset_prototype(part, prototype):
+    resetter = _resetters.get(type(part))
+    if resetter is None:
+        resetter = _resetters[type(part)] = _resetter_for(type(part))
+    resetter((part,), prototype)
+    return part
 
 
 class Maze:
+    clone_spec = CloneSpec()
+
     def clone(self):
-        return deepcopy(self)
+        return clone_prototype(self)
 
 
 class Wall:
+    clone_spec = CloneSpec()
+
     def clone(self):
-        return deepcopy(self)
+        return clone_prototype(self)
 
 
 class Room:
+    clone_spec = CloneSpec(shallow=("room_id",))
+
     def __init__(self, room_id):
         self.room_id = room_id
 
     def clone(self):
-        return deepcopy(self)
+        return clone_prototype(self)
 
 
 class Door:
+    # A cloned door is connected by initialize(), so the prototype's rooms are never copied
+    clone_spec = CloneSpec(reset={"room1": None, "room2": None})
+
     def __init__(self, room1=None, room2=None):
         self.room1 = room1
         self.room2 = room2
@@ -29,7 +157,7 @@ class Door:
         self.room2 = room2
 
     def clone(self):
-        return deepcopy(self)
+        return clone_prototype(self)
 
 
 class MazePrototypeFactory:
@@ -40,18 +168,18 @@ class MazePrototypeFactory:
         self._prototypeDoor = door_prototype
 
     def make_maze(self):
-        return self._prototypeMaze.clone()
+        return clone_prototype(self._prototypeMaze)
 
     def make_wall(self):
-        return self._prototypeWall.clone()
+        return clone_prototype(self._prototypeWall)
 
     def make_room(self, room_id):
-        room = self._prototypeRoom.clone()
+        room = clone_prototype(self._prototypeRoom)
         room.room_id = room_id
         return room
 
     def make_door(self, room1, room2):
-        door = self._prototypeDoor.clone()
+        door = clone_prototype(self._prototypeDoor)
         door.initialize(room1, room2)
         return door
 
@@ -73,33 +201,257 @@ door = factory.make_door(room1, room2)
 
 
 class BombedWall(Wall):
+    clone_spec = CloneSpec(shallow=("_bomb",))
+
     def __init__(self, has_bomb=False):
         self._bomb = has_bomb
 
-    def clone(self):
-        return deepcopy(self)
-
 
 class RoomWithABomb(Room):
+    clone_spec = CloneSpec(shallow=("room_id", "_bomb"))
+
     def __init__(self, room_id, has_bomb=False):
         super().__init__(room_id)
         self._bomb = has_bomb
 
 
+class PartPool:
+    # Free list of parts cloned from one prototype, with the counts pool_stats() reports
+    def __init__(self, prototype, max_free=None):
+        self.prototype = prototype
+        self.max_free = max_free
+        self.free = []
+        self._free_ids = set()
+        # hits and in_use are derived from these; in_use only drops on release, so its peak is
+        # recorded there rather than on every acquire
+        self.acquired = 0
+        self.misses = 0
+        # Handed back parts that went onto the free list, and those that were thrown away instead
+        self.released = 0
+        self.dropped = 0
+        self._high_water = 0
+
+    @property
+    def in_use(self):
+        return max(self.acquired - self.released - self.dropped, 0)
+
+    @property
+    def high_water(self):
+        return max(self._high_water, self.in_use)
+
+    def acquire(self):
+        self.acquired += 1
+        if self.free:
+            part = self.free.pop()
+            self._free_ids.discard(id(part))
+            return part
+        self.misses += 1
+        return clone_prototype(self.prototype)
+
+    def release(self, part):
+        self.release_many((part,))
+
+    def release_many(self, parts):
+        # Parts of another class (cloned before the key was re-registered) or beyond max_free are dropped
+        kind, prototype = type(self.prototype), self.prototype
+        parts = list(parts)
+        kept = [part for part in parts if type(part) is kind]
+        if self.max_free is not None:
+            del kept[max(self.max_free - len(self.free), 0):]
+        ids = set(map(id, kept))
+        if len(ids) != len(kept) or not ids.isdisjoint(self._free_ids):
+            raise ValueError("A part was released to the pool twice.")
+        self._high_water = self.high_water
+        self.released += len(kept)
+        self.dropped += len(parts) - len(kept)
+        reset = _resetters.get(kind)
+        if reset is None:
+            reset = _resetters[kind] = _resetter_for(kind)
+        reset(kept, prototype)
+        self.free += kept
+        self._free_ids |= ids
+
+    def prewarm(self, count):
+        while len(self.free) < count:
+            part = clone_prototype(self.prototype)
+            self.free.append(part)
+            self._free_ids.add(id(part))
+
+    def stats(self):
+        return {"hits": self.acquired - self.misses, "misses": self.misses, "released": self.released,
+                "dropped": self.dropped, "free": len(self.free), "in_use": self.in_use, "high_water": self.high_water}
+
+
 class PrototypeManager:
-    def __init__(self):
+    def __init__(self, max_free=None):
         self._prototypes = {}
+        self._pools = {}
+        # id(maze) -> (maze, {key: [part, ...]}) for parts acquired on behalf of a maze
+        self._leases = {}
+        self.max_free = max_free
 
     def register_prototype(self, key, prototype):
         self._prototypes[key] = prototype
+        old_pool = self._pools.get(key)
+        if old_pool is not None:
+            # Free parts cloned from the old prototype are dropped; those handed out still count as in use
+            pool = self._pools[key] = PartPool(prototype, self.max_free)
+            pool.acquired, pool._high_water = old_pool.in_use, old_pool.high_water
 
     def unregister_prototype(self, key):
         if key in self._prototypes:
             del self._prototypes[key]
+        self._pools.pop(key, None)
 
     def get_prototype(self, key):
         return self._prototypes.get(key)
 
+    def stamp(self, key, maze, offsets):
+        # Region prototypes (Maze_Regions.RegionPrototype) are stamped into a maze in bulk, not cloned part by part
+        prototype = self._prototypes.get(key)
+        if not hasattr(prototype, "stamp"):
+            raise ValueError(f"No region prototype is registered as '{key}'.")
+        return prototype.stamp(maze, offsets)
+
+    def _pool(self, key):
+        pool = self._pools.get(key)
+        if pool is None:
+            prototype = self._prototypes.get(key)
+            if prototype is None:
+                raise ValueError(f"No prototype is registered as '{key}'.")
+            pool = self._pools[key] = PartPool(prototype, self.max_free)
+        return pool
+
+    def prewarm(self, key, count):
+        self._pool(key).prewarm(count)
+
+    def acquire(self, key, maze=None):
+        # A part from the key's free list, or a fresh clone when it is empty. Parts acquired for a maze
+        # all go back with release_maze(maze).
+        part = self._pool(key).acquire()
+        if maze is not None:
+            self.lease(maze, key).append(part)
+        return part
+
+    def lease(self, maze, key):
+        # The list of key's parts held by maze; anything appended to it is returned by release_maze(maze)
+        lease = self._leases.get(id(maze))
+        if lease is None:
+            lease = self._leases[id(maze)] = (maze, {})
+        parts = lease[1].get(key)
+        if parts is None:
+            parts = lease[1][key] = []
+        return parts
+
+    def release(self, key, part):
+        pool = self._pools.get(key)
+        if pool is not None:
+            pool.release(part)
+
+    def release_maze(self, maze):
+        _, parts = self._leases.pop(id(maze), (None, {}))
+        for key, key_parts in parts.items():
+            pool = self._pools.get(key)
+            if pool is not None:
+                pool.release_many(key_parts)
+        return sum(map(len, parts.values()))
+
+    def pool_stats(self, key):
+        return self._pool(key).stats()
+
+
+class PooledMazeFactory(MazePrototypeFactory):
+    # Same make_* calls, but parts come from a PrototypeManager's pools and are leased to the maze
+    # made last; release(maze) hands the maze and all of its parts back
+    def __init__(self, manager, maze_key, wall_key, room_key, door_key):
+        super().__init__(*(manager.get_prototype(key) for key in (maze_key, wall_key, room_key, door_key)))
+        self._manager = manager
+        self._keys = maze_key, wall_key, room_key, door_key
+        self._pools = [manager._pool(key) for key in self._keys]
+        self._parts = None
+
+    def make_maze(self):
+        maze = self._pools[0].acquire()
+        # Lists the parts of this maze are recorded in, one per part key
+        self._parts = [self._manager.lease(maze, key) for key in self._keys[1:]]
+        return maze
+
+    def make_wall(self):
+        wall = self._pools[1].acquire()
+        self._parts[0].append(wall)
+        return wall
+
+    def make_room(self, room_id):
+        room = self._pools[2].acquire()
+        self._parts[1].append(room)
+        room.room_id = room_id
+        return room
+
+    def make_door(self, room1, room2):
+        door = self._pools[3].acquire()
+        self._parts[2].append(door)
+        door.initialize(room1, room2)
+        return door
+
+    def release(self, maze):
+        self._manager.release_maze(maze)
+        self._pools[0].release(maze)
+
+
+def _build(factory, rooms):
+    maze = factory.make_maze()
+    previous = factory.make_room(0)
+    for room_id in range(1, rooms):
+        room = factory.make_room(room_id)
+        factory.make_door(previous, room)
+        factory.make_wall()
+        previous = room
+    return maze
+
+
+def benchmark_pool(rooms=10_000, rounds=20):
+    manager = PrototypeManager()
+    for key, prototype in (("maze", Maze()), ("wall", Wall()), ("room", Room(1)), ("door", Door())):
+        manager.register_prototype(key, prototype)
+    plain = MazePrototypeFactory(Maze(), Wall(), Room(1), Door())
+    began = perf_counter()
+    for _ in range(rounds):
+        _build(plain, rooms)
+    cloned = perf_counter() - began
+    pooled = PooledMazeFactory(manager, "maze", "wall", "room", "door")
+    for key in ("wall", "room", "door"):
+        manager.prewarm(key, rooms)
+    built = released = 0.0
+    for _ in range(rounds):
+        began = perf_counter()
+        maze = _build(pooled, rooms)
+        built += perf_counter() - began
+        began = perf_counter()
+        pooled.release(maze)
+        released += perf_counter() - began
+    parts = rounds * (3 * rooms - 2) + rounds
+    print(f"{rounds} mazes of {rooms} rooms ({parts} parts), each built and thrown away:")
+    print(f"  cloned  {cloned:6.3f} s   {parts / cloned:12,.0f} parts/s")
+    print(f"  pooled  {built + released:6.3f} s   {parts / (built + released):12,.0f} parts/s   "
+          f"(building {built:.3f} s, releasing and resetting {released:.3f} s)")
+    for key in ("room", "door"):
+        print(f"  {key} pool: {manager.pool_stats(key)}")
+
+
+def benchmark(count=200_000):
+    print(f"Cloning {count} parts per prototype:")
+    for prototype in (Wall(), Room(1), Door(), BombedWall(True), RoomWithABomb(1, True)):
+        began = perf_counter()
+        for _ in range(count):
+            deepcopy(prototype)
+        deep = perf_counter() - began
+        began = perf_counter()
+        for _ in range(count):
+            clone_prototype(prototype)
+        fast = perf_counter() - began
+        print(f"  {type(prototype).__name__:<14} deepcopy {count / deep:>12,.0f}/s   clone spec {count / fast:>12,.0f}/s   "
+              f"{deep / fast:5.1f}x")
+
 
 if __name__ == "__main__":
     # Create initial prototypes
@@ -134,4 +486,7 @@ if __name__ == "__main__":
     print(f"Created room1: {room1.room_id}")
     print(f"Created room2: {room2.room_id}")
     print(f"Created door between rooms: {door.room1.room_id} and {door.room2.room_id}")
-
+    print()
+    benchmark(*map(int, sys.argv[1:2]))
+    print()
+    benchmark_pool(*map(int, sys.argv[2:4]))
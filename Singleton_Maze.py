@@ -1,6 +1,15 @@
+import asyncio
 import os
+import sys
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from enum import Enum
+from time import perf_counter
+
+from Maze_Events import bus, EventType, PrintSink
 
 class Direction(Enum):
     North = 1
@@ -19,6 +28,8 @@ class Room(MapSite):
     def __init__(self, room_no):
         self.room_number = room_no
         self._sides = [None] * 4
+        if bus.enabled:
+            bus.emit(EventType.ROOM_CREATED, **self.describe())
 
     def get_side(self, direction: Direction):
         return self._sides[direction.value - 1]
@@ -26,54 +37,54 @@ class Room(MapSite):
     def set_side(self, direction: Direction, map_site: MapSite):
         self._sides[direction.value - 1] = map_site
 
+    def describe(self):
+        return {"room": self.room_number, "kind": type(self).__name__}
+
     def enter(self):
-        print(f"Entering room number {self.room_number}")
+        if bus.enabled:
+            bus.emit(EventType.ROOM_ENTERED, **self.describe())
 
 class EnchantedRoom(Room):
     def __init__(self, room_no, spell):
-        super().__init__(room_no)
         self.spell = spell
+        super().__init__(room_no)
 
-    def enter(self):
-        print(f"Entering enchanted room number {self.room_number} with spell {self.spell}")
+    def describe(self):
+        return {**super().describe(), "spell": self.spell}
 
 class RoomWithABomb(Room):
     def __init__(self, room_no):
-        super().__init__(room_no)
         self.has_bomb = True
         self.bomb_exploded = False
+        super().__init__(room_no)
 
-    def enter(self):
-        if self.has_bomb and not self.bomb_exploded:
-            print(f"Entering room number {self.room_number} with a bomb!")
-        elif self.bomb_exploded:
-            print(f"Entering room number {self.room_number}.\n!!!The bomb has exploded!!!")
-        else:
-            print(f"Entering room number {self.room_number}")
+    def describe(self):
+        return {**super().describe(), "has_bomb": self.has_bomb, "bomb_exploded": self.bomb_exploded}
 
     def explode_bomb(self):
         if self.has_bomb and not self.bomb_exploded:
             self.bomb_exploded = True
-            print(f"The bomb in room number {self.room_number} has exploded!")
+            if bus.enabled:
+                bus.emit(EventType.BOMB_EXPLODED, room=self.room_number)
 
 # Concrete classes for walls
 class Wall(MapSite):
     def enter(self):
-        print("You hit a wall.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_HIT, kind=type(self).__name__, damaged=False)
 
 class BombedWall(Wall):
     def __init__(self):
         self.is_damaged = False
 
     def enter(self):
-        if self.is_damaged:
-            print("You hit a damaged wall.")
-        else:
-            print("You hit a wall.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_HIT, kind=type(self).__name__, damaged=self.is_damaged)
 
     def damage(self):
         self.is_damaged = True
-        print("The wall is now damaged.")
+        if bus.enabled:
+            bus.emit(EventType.WALL_DAMAGED, kind=type(self).__name__)
 
 # Concrete classes for doors
 class Door(MapSite):
@@ -83,10 +94,8 @@ class Door(MapSite):
         self.is_open = False
 
     def enter(self):
-        if self.is_open:
-            print("You pass through the door")
-        else:
-            print("The door is closed.")
+        if bus.enabled:
+            bus.emit(EventType.DOOR_ENTERED, kind=type(self).__name__, open=self.is_open)
 
     def other_side_from(self, room):
         if room == self.room_1:
@@ -96,11 +105,7 @@ class Door(MapSite):
         return None
 
 class DoorNeedingSpell(Door):
-    def enter(self):
-        if self.is_open:
-            print("You pass through the enchanted door.")
-        else:
-            print("The enchanted door is closed.")
+    pass
 
 # Maze and factory classes
 class Maze:
@@ -113,20 +118,35 @@ class Maze:
     def room_no(self, room_number):
         return self.rooms.get(room_number, None)
 
+# Factory chosen for the current thread or asyncio task; None falls through to the global default
+_current_factory = ContextVar("maze_factory", default=None)
+_default_lock = threading.Lock()
+
+
 class MazeFactory:
+    # Process-wide default, made from MAZESTYLE on first use
     _instance = None
 
     @classmethod
     def instance(cls):
-        if cls._instance is None:
-            maze_style = os.getenv("MAZESTYLE", "default")
-            if maze_style == "bombed":
-                cls._instance = BombedMazeFactory()
-            elif maze_style == "enchanted":
-                cls._instance = EnchantedMazeFactory()
-            else:
-                cls._instance = MazeFactory()
-        return cls._instance
+        # The hot path is a context variable read and an attribute read; the lock is only taken
+        # while the global default is being created
+        factory = _current_factory.get()
+        if factory is not None:
+            return factory
+        factory = MazeFactory._instance
+        if factory is None:
+            with _default_lock:
+                if MazeFactory._instance is None:
+                    MazeFactory._instance = factory_for_style(os.getenv("MAZESTYLE", "default"), strict=False)
+                factory = MazeFactory._instance
+        return factory
+
+    @classmethod
+    def set_default(cls, factory=None):
+        # None drops the default so the next instance() reads MAZESTYLE again (for tests)
+        with _default_lock:
+            MazeFactory._instance = factory
 
     def make_maze(self):
         return Maze()
@@ -157,6 +177,30 @@ class BombedMazeFactory(MazeFactory):
     def make_wall(self):
         return BombedWall()
 
+_STYLES = {"default": MazeFactory, "bombed": BombedMazeFactory, "enchanted": EnchantedMazeFactory}
+
+
+def factory_for_style(style, strict=True):
+    factory_class = _STYLES.get(style)
+    if factory_class is None:
+        if strict:
+            raise ValueError(f"Unknown maze style '{style}', expected one of {', '.join(_STYLES)}.")
+        factory_class = MazeFactory
+    return factory_class()
+
+
+@contextmanager
+def maze_style(style_or_factory):
+    # Scopes a factory to the current thread or asyncio task (tasks copy the context they start in,
+    # so a style set inside one task never leaks into another)
+    factory = factory_for_style(style_or_factory) if isinstance(style_or_factory, str) else style_or_factory
+    token = _current_factory.set(factory)
+    try:
+        yield factory
+    finally:
+        _current_factory.reset(token)
+
+
 # Maze game that uses the factory
 class MazeGame:
     def create_maze(self):
@@ -181,11 +225,58 @@ class MazeGame:
 
         return a_maze
 
+def _style_of(maze):
+    return type(maze.room_no(1)).__name__
+
+
+async def _build_styles(styles):
+    maze_game = MazeGame()
+
+    async def build(style):
+        with maze_style(style):
+            # Yield so the tasks interleave while each holds a different style
+            await asyncio.sleep(0)
+            return _style_of(maze_game.create_maze())
+
+    return await asyncio.gather(*(build(style) for style in styles))
+
+
+def benchmark(calls=1_000_000, threads=8, mazes=2_000):
+    began = perf_counter()
+    for _ in range(calls):
+        MazeFactory.instance()
+    default = perf_counter() - began
+    with maze_style("bombed"):
+        began = perf_counter()
+        for _ in range(calls):
+            MazeFactory.instance()
+        scoped = perf_counter() - began
+    print(f"instance(): global default {default / calls * 1e9:.0f} ns, context-scoped {scoped / calls * 1e9:.0f} ns")
+    styles = list(_STYLES)
+    maze_game = MazeGame()
+
+    def worker(index):
+        style = styles[index % len(styles)]
+        with maze_style(style):
+            built = [_style_of(maze_game.create_maze()) for _ in range(mazes)]
+        return style, set(built)
+
+    began = perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(worker, range(threads)))
+    elapsed = perf_counter() - began
+    mixed = [style for style, kinds in results if len(kinds) != 1]
+    print(f"{threads} threads x {mazes} mazes in styles {', '.join(styles)}: {elapsed:.2f} s, "
+          f"threads that saw another style's rooms: {len(mixed)}")
+
+
 # Example usage
 if __name__ == "__main__":
     maze_game = MazeGame()
     os.environ["MAZESTYLE"] = "enchanted"
     maze = maze_game.create_maze()
+    # Subscribed once the maze is built: this demo only narrates moving through it
+    console = bus.subscribe(PrintSink())
     room1 = maze.room_no(1)
     room2 = maze.room_no(2)
 
@@ -195,3 +286,9 @@ if __name__ == "__main__":
         door.enter()
         next_room = door.other_side_from(room1)
         next_room.enter()
+
+    bus.unsubscribe(console)
+    print()
+    print("Concurrent asyncio builds:", asyncio.run(_build_styles(["bombed", "enchanted", "default", "bombed"])))
+    print(f"Outside any scope the default is still {type(MazeFactory.instance()).__name__}")
+    benchmark(*map(int, sys.argv[1:4]))
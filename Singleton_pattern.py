@@ -1,17 +1,142 @@
-class God:
-    _instance = None
+import os
+import sys
+import threading
+import warnings
+from contextlib import contextmanager
+from time import perf_counter
 
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance.name = kwargs.get('name', 'The Almighty')
-        return cls._instance
+# class -> its one instance, shared by every class built with SingletonMeta
+_instances = {}
+# Reentrant so a singleton's __init__ may create another singleton
+_lock = threading.RLock()
+
+
+class SingletonMeta(type):
+    def __call__(cls, *args, **kwargs):
+        # Fast path: once the instance exists, a plain dict read with no lock
+        instance = _instances.get(cls)
+        if instance is None:
+            with _lock:
+                instance = _instances.get(cls)
+                if instance is None:
+                    instance = _instances[cls] = super().__call__(*args, **kwargs)
+                    return instance
+        if args or kwargs:
+            warnings.warn(f"{cls.__name__} already exists; the arguments of this call are ignored.",
+                          RuntimeWarning, stacklevel=2)
+        return instance
+
+    def has_instance(cls):
+        return cls in _instances
+
+    def reset_instance(cls):
+        # Drops the instance so the next call creates a new one
+        with _lock:
+            return _instances.pop(cls, None)
+
+    @staticmethod
+    def reset_all():
+        with _lock:
+            _instances.clear()
+
+    @staticmethod
+    @contextmanager
+    def isolated():
+        # For tests: singletons made inside the block are discarded and the previous ones come back
+        with _lock:
+            saved = dict(_instances)
+            _instances.clear()
+        try:
+            yield
+        finally:
+            with _lock:
+                _instances.clear()
+                _instances.update(saved)
+
+
+def _after_fork_in_child():
+    # The child must not share the parent's instances (sockets, threads, pools), and the lock may
+    # have been held by a parent thread that does not exist in the child
+    global _lock
+    _lock = threading.RLock()
+    _instances.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class God(metaclass=SingletonMeta):
+    def __init__(self, name='The Almighty'):
+        self.name = name
 
     def speak(self):
         print(f'I am {self.name}, the one and only.')
 
 
-god1 = God(name="Zeus")
-god2 = God(name="Gholi")
+class _AlwaysLockedMeta(type):
+    # The naive thread-safe version the benchmark compares against: every call takes the lock
+    _instances = {}
+    _lock = threading.Lock()
+
+    def __call__(cls, *args, **kwargs):
+        with _AlwaysLockedMeta._lock:
+            instance = _AlwaysLockedMeta._instances.get(cls)
+            if instance is None:
+                instance = _AlwaysLockedMeta._instances[cls] = super().__call__(*args, **kwargs)
+            return instance
+
+
+def benchmark(threads=64, calls=20_000):
+    class FastPath(metaclass=SingletonMeta):
+        pass
+
+    class AlwaysLocked(metaclass=_AlwaysLockedMeta):
+        pass
+
+    print(f"{threads} threads x {calls} calls each:")
+    for cls in (AlwaysLocked, FastPath):
+        start = threading.Barrier(threads + 1)
+        seen = set()
+
+        def worker():
+            start.wait()
+            instance = None
+            for _ in range(calls):
+                instance = cls()
+            seen.add(id(instance))
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        start.wait()
+        began = perf_counter()
+        for thread in workers:
+            thread.join()
+        elapsed = perf_counter() - began
+        print(f"  {cls.__name__:<13} {elapsed:6.3f} s   {threads * calls / elapsed:12,.0f} calls/s   "
+              f"instances seen: {len(seen)}")
+
+
+# Example usage
+if __name__ == "__main__":
+    god1 = God(name="Zeus")
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        god2 = God(name="Gholi")
+    god2.speak()
+    print(f"Same instance: {god1 is god2}; warning: {caught[0].message}")
+
+    with SingletonMeta.isolated():
+        print(f"Inside an isolated scope: {God(name='Odin').name}")
+    print(f"After it: {God().name}")
 
-god2.speak()
+    if hasattr(os, "fork"):
+        pid = os.fork()
+        if pid == 0:
+            print(f"Forked child starts without the parent's instance: {not God.has_instance()}, "
+                  f"new one: {God(name='Hermes').name}")
+            os._exit(0)
+        os.waitpid(pid, 0)
+    print()
+    benchmark(*map(int, sys.argv[1:3]))